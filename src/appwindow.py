@@ -1,3 +1,4 @@
+import os
 import gi
 import numpy as np
 import drawable
@@ -5,9 +6,16 @@ gi.require_version('Gtk', '3.0')
 gi.require_foreign("cairo")
 
 from enum import auto, Enum
-from gi.repository import Gtk, Gdk
-from transformations import rotation_matrix, viewport_matrix
-from clipping import LineClippingMethod
+from typing import List
+from gi.repository import Gtk, Gdk, GLib
+from transformations import (
+    rotation_about,
+    rotation_matrix,
+    scale_matrix,
+    translate_matrix,
+    window_viewport_matrix,
+)
+from instrumentation import FrameStats, StartupReport
 from drawable import (
     Point,
     Vetor2D,
@@ -15,7 +23,6 @@ from drawable import (
     GraphicObject,
     Polygon,
     Rectangle,
-    Window,
     View,
     Curve
 )
@@ -27,6 +34,11 @@ OBJECT_TYPES = {
     3: "curve",
     }
 
+SCENE_FILTERS = (
+    ('Wavefront OBJ', '*.obj'),
+    ('Cena binária', '*.sbs'),
+)
+
 EVENTS = {
     1: 'left',
     2: 'middle',
@@ -48,11 +60,9 @@ class NewObjectWindowHandler:
         self.vertices = []
 
     def onCancel(self, widget):
-        dialog = self.builder.get_object("dialog_object")
-        dialog.destroy()
+        pass
 
     def onOk(self, widget):
-        window = self.builder.get_object("dialog_object")
         notebook = self.builder.get_object("notebook1")
 
         page_number = notebook.get_current_page()
@@ -86,12 +96,14 @@ class NewObjectWindowHandler:
             elif self.builder.get_object('btn_bspline').get_active():
                 type = 'bspline'
 
+            adaptive = self.builder.get_object('check_adaptive').get_active()
             if len(self.vertices) >= 4:
-                self.dialog.new_object = Curve.control_point(self.vertices, type=type, name=name)
+                self.dialog.new_object = Curve.control_point(
+                    self.vertices, type=type, name=name, adaptive=adaptive
+                )
         else:
             print("Invalid Page")
             raise ValueError('No page with given index.')
-        window.destroy()
 
     def onAddPoint(self, widget):
         notebook = self.builder.get_object("notebook1")
@@ -109,80 +121,257 @@ class NewObjectWindowHandler:
         print(f'Ponto Adicionado: {x}, {y}')
 
 
-class NewObjectWindow(Gtk.Dialog):
-    def __init__(self, *args, **kwargs):
-        super().__init__(self, *args, **kwargs)
-
+class NewObjectWindow:
+    # montado uma vez só; os botões só escondem o diálogo, e a cada
+    # abertura os campos voltam ao estado do arquivo .glade
+    def __init__(self, parent: Gtk.Window = None):
         self.builder = Gtk.Builder.new_from_file("../interface/dialog_object.glade")
-        self.builder.connect_signals(
-            NewObjectWindowHandler(self, self.builder)
-        )
+        self.handler = NewObjectWindowHandler(self, self.builder)
+        self.builder.connect_signals(self.handler)
         self.new_object = None
 
         self.dialog_window = self.builder.get_object("dialog_object")
+        self.dialog_window.set_transient_for(parent)
+        self.dialog_window.connect('delete-event', lambda widget, event: widget.hide_on_delete())
+        self.initial = self.state()
+
+    def state(self):
+        entries = {}
+        toggles = {}
+        for widget in self.builder.get_objects():
+            if isinstance(widget, Gtk.Entry):
+                entries[widget] = widget.get_text()
+            elif isinstance(widget, (Gtk.ToggleButton, Gtk.Switch)):
+                toggles[widget] = widget.get_active()
+        return entries, toggles
+
+    def reset(self):
+        entries, toggles = self.initial
+        for widget, text in entries.items():
+            widget.set_text(text)
+        for widget, active in toggles.items():
+            widget.set_active(active)
+        self.builder.get_object("notebook1").set_current_page(0)
+        self.handler.vertices = []
+        self.new_object = None
+
+    def run(self) -> Gtk.ResponseType:
+        self.reset()
+        response = self.dialog_window.run()
+        self.dialog_window.hide()
+        return response
 
 class MainWindowHandler:
-    def __init__(self, builder):
+    def __init__(self, builder, startup: StartupReport = None):
         self.builder = builder
+        self.startup = startup
+        self.object_dialog = None
         self.window = self.builder.get_object("main_window")
         self.object_store = self.builder.get_object("object_store")
         self.view = View()
         self.press_start = None
         self.size = []
         self.rotation_ref = RotationRef.CENTER
-        self.clipping_method = LineClippingMethod.COHEN_SUTHERLAND
+        # None até o primeiro desenho, que carrega o clipping
+        self.clipping_method = None
+        # SB_FRAME_LOG=arquivo.jsonl grava as estatísticas de cada frame
+        self.stats = FrameStats(log_path=os.environ.get('SB_FRAME_LOG'))
+        # SB_WORKERS=n reparte o clipping das cenas grandes entre n processos
+        workers = os.environ.get('SB_WORKERS')
+        self.executor = None
+        if workers:
+            from parallel import ParallelExecutor
+            self.executor = ParallelExecutor(int(workers) or None)
+        self._renderer = None
+
+    @property
+    def renderer(self):
+        # os frames são desenhados numa thread; a interface só mostra o
+        # último. Clipping, backing store e a thread só são carregados
+        # aqui, no primeiro desenho, com a janela já na tela
+        if self._renderer is None:
+            from backing import BackingStore
+            from clipping import LineClippingMethod
+            from renderthread import RenderThread
+            if self.clipping_method is None:
+                self.clipping_method = LineClippingMethod.COHEN_SUTHERLAND
+            self._renderer = RenderThread(
+                self.view,
+                lambda: GLib.idle_add(self.onFrame),
+                BackingStore(self.executor),
+            )
+        return self._renderer
 
     def onDestroy(self, *args):
+        if self._renderer is not None:
+            self._renderer.close()
+        self.stats.close()
+        if self.executor is not None:
+            self.executor.close()
         self.window.get_application().quit()
 
     def viewport(self) -> Rectangle:
+        from render import viewport_rect
         widget = self.builder.get_object('drawing_area')
-        return Rectangle(
-            min=Vetor2D(0, 0),
-            max=Vetor2D(
-                widget.get_allocated_width(),
-                widget.get_allocated_height(),
-            )
-        ).with_margin(10)
+        return viewport_rect(
+            widget.get_allocated_width(),
+            widget.get_allocated_height(),
+        )
 
     def onDraw(self, widget, cr):
+        from render import default_window
+        renderer = self.renderer
         if self.view.window is None:
             self.size = (widget.get_allocated_width(), widget.get_allocated_height())
-            self.view.window = Window(
-                Vetor2D(-self.size[0]/2,-self.size[1]/2),
-                Vetor2D(self.size[0]/2, self.size[1]/2),
-            )
+            self.view.window = default_window(*self.size)
 
         viewport = self.viewport()
-        vp_matrix = viewport_matrix(viewport)
-
-        cr.set_line_width(1.0)
-        cr.paint()
-        cr.set_source_rgb(0, 0, 100)
+        stats = self.stats if self.stats.enabled else None
+        self.view.set_viewport(viewport)
+        renderer.request(
+            viewport,
+            (widget.get_allocated_width(), widget.get_allocated_height()),
+            self.clipping_method,
+            stats,
+        )
+        renderer.paint(cr, viewport, stats)
+        if self.startup is not None and 'first draw' not in self.startup.phases:
+            self.startup.mark('first draw')
 
-        for object in self.view.obj_list:
-            clipped = object.clipped(method=self.clipping_method)
-            if clipped:
-                clipped.draw(cr, vp_matrix)
-        viewport.draw(cr, vp_matrix)
+    def onFrame(self):
+        self.builder.get_object('drawing_area').queue_draw()
+        if self.startup is not None and 'first frame' not in self.startup.phases:
+            self.startup.mark('first frame')
+            self.startup.report()
+        return False
 
     def onNewObject(self, widget):
-        dialog = NewObjectWindow()
-        response = dialog.dialog_window.run()
+        if self.object_dialog is None:
+            self.object_dialog = NewObjectWindow(self.window)
+        dialog = self.object_dialog
+        response = dialog.run()
 
         if response == Gtk.ResponseType.OK:
             #print("The OK button was clicked")
             if dialog.new_object is not None:
-                self.view.add_object(dialog.new_object)
-                self.add_object(dialog.new_object)
+                new_object = dialog.new_object
+
+                def change():
+                    self.view.add_object(new_object)
+                    # a linha precisa do id, que o objeto só tem na View
+                    GLib.idle_add(self.add_object, new_object)
+                self.renderer.mutate(change)
                 self.builder.get_object("drawing_area").queue_draw()
             else:
                 print("Objeto Inválido")
         elif response == Gtk.ResponseType.CANCEL:
             print("The Cancel button was clicked")
 
+    def choose_file(self, title: str, action: Gtk.FileChooserAction):
+        dialog = Gtk.FileChooserDialog(title=title, parent=self.window, action=action)
+        dialog.add_buttons(
+            Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL,
+            Gtk.STOCK_SAVE if action == Gtk.FileChooserAction.SAVE else Gtk.STOCK_OPEN,
+            Gtk.ResponseType.OK,
+        )
+        dialog.set_do_overwrite_confirmation(True)
+        for name, pattern in SCENE_FILTERS:
+            file_filter = Gtk.FileFilter()
+            file_filter.set_name(name)
+            file_filter.add_pattern(pattern)
+            dialog.add_filter(file_filter)
+
+        response = dialog.run()
+        path = dialog.get_filename()
+        dialog.destroy()
+        return path if response == Gtk.ResponseType.OK else None
+
+    def onImport(self, widget):
+        path = self.choose_file('Importar cena', Gtk.FileChooserAction.OPEN)
+        if path is None:
+            return
+        try:
+            with self.renderer.hold():
+                if path.endswith('.sbs'):
+                    import scenefile
+                    objects = scenefile.load(path, self.view)
+                else:
+                    import wavefront
+                    objects = wavefront.load(path, self.view, executor=self.executor)
+        except (OSError, ValueError) as error:
+            print(f'Erro ao importar {path}: {error}')
+            return
+
+        if len(self.view.store.unindexed):
+            # a cena já pode ser desenhada; o índice espacial é
+            # montado aos poucos enquanto a interface está ociosa
+            GLib.idle_add(self.index_pending)
+        self.append_rows(objects)
+        self.builder.get_object("drawing_area").queue_draw()
+
+    def onExport(self, widget):
+        path = self.choose_file('Exportar cena', Gtk.FileChooserAction.SAVE)
+        if path is None:
+            return
+        try:
+            # aplicar as transformações pendentes também mexe na cena
+            with self.renderer.hold():
+                if path.endswith('.sbs'):
+                    import scenefile
+                    scenefile.write(path, self.view.obj_list)
+                else:
+                    import wavefront
+                    wavefront.write(path, self.view.obj_list)
+        except (OSError, ValueError) as error:
+            print(f'Erro ao exportar {path}: {error}')
+
+    def index_pending(self):
+        # sem esperar pelo frame em andamento: tenta de novo na próxima folga
+        if not self.renderer.lock.acquire(blocking=False):
+            return True
+        try:
+            return self.view.index_pending()
+        finally:
+            self.renderer.lock.release()
+
     def add_object(self, object: GraphicObject):
-        self.object_store.append([object.name, str(f'{type(object).__name__}')])
+        self.object_store.append(self.row(object))
+
+    def add_objects(
+            self,
+            objects: List[GraphicObject],
+            vertices: np.ndarray = None,
+            lengths: np.ndarray = None,
+    ):
+        # muitos objetos de uma vez (scripts, importadores): um bloco só no
+        # display file, uma normalização, as linhas da lista com o modelo
+        # desligado da árvore e um único redesenho
+        objects = list(objects)
+
+        def change():
+            self.view.add_objects(objects, vertices, lengths)
+            GLib.idle_add(self.append_rows, objects)
+        self.renderer.mutate(change)
+        self.builder.get_object("drawing_area").queue_draw()
+
+    def row(self, object: GraphicObject) -> list:
+        # nome, tipo e, numa coluna escondida, o id do objeto na View
+        return [object.name, type(object).__name__, object.id]
+
+    def append_rows(self, objects: List[GraphicObject]):
+        # com o modelo ligado a árvore se atualiza a cada linha
+        tree = self.builder.get_object('tree_displayfiles')
+        selection = tree.get_selection()
+        _, selected = selection.get_selected_rows()
+        tree.set_model(None)
+        try:
+            append = self.object_store.append
+            for object in objects:
+                append(self.row(object))
+        finally:
+            tree.set_model(self.object_store)
+            for path in selected:
+                selection.select_path(path)
 
     def onResize(self, widget: Gtk.Widget, allocation: Gdk.Rectangle):
         w_proportion = allocation.width / self.size[0]
@@ -198,7 +387,6 @@ class MainWindowHandler:
         )
 
         self.size = (allocation.width, allocation.height)
-        self.view.update_norm_coord()
 
     def navigationButton(self, widget):
         TRANSFORMATIONS = {
@@ -212,40 +400,58 @@ class MainWindowHandler:
             'nav-zoom-out': ('scale', Vetor2D(0.9, 0.9)),
         }
 
-        op, *args = TRANSFORMATIONS[widget.get_name()]
+        op, arg = TRANSFORMATIONS[widget.get_name()]
+        selected = self.selected_objs()
+
+        if op == 'translate' and not selected and self.view.window is not None:
+            # sem seleção as setas movem a window
+            self.pan_window(arg.x, arg.y)
 
-        for object in self.selected_objs():
+        # a seleção inteira é transformada de uma vez, com uma matriz só;
+        # em torno do centroide de cada objeto quando `centered`
+        if selected:
+            centered = False
             if op == 'translate':
-                args[0] = (
-                        args[0] @ rotation_matrix(self.view.window.angle)
-                )
-                object.translate(*args)
+                # o deslocamento acompanha a rotação da window
+                offset = arg @ rotation_matrix(self.view.window.angle)
+                matrix = translate_matrix(offset.x, offset.y)
             elif op == 'scale':
-                object.scale(*args)
-            elif op == 'rotate':
-                try:
-                    arb_x = int(entry_text(self, 'rot_x'))
-                    arb_y = int(entry_text(self, 'rot_y'))
-                except ValueError:
-                    arb_x = 0
-                    arb_y = 0
-
-                ref = {
-                    RotationRef.CENTER: object.centroid,
-                    RotationRef.ORIGIN: Vetor2D(0, 0),
-                    RotationRef.ARBITRARY: Vetor2D(float(arb_x), float(arb_y)),
-                }[self.rotation_ref]
-
-                object.rotate(*args, ref)
-            object.update_norm_coord(self.view.window)
+                matrix = scale_matrix(arg.x, arg.y)
+                centered = True
+            elif self.rotation_ref == RotationRef.CENTER:
+                matrix = rotation_matrix(arg)
+                centered = True
+            else:
+                arb_x = arb_y = 0
+                if self.rotation_ref == RotationRef.ARBITRARY:
+                    try:
+                        arb_x = int(entry_text(self, 'rot_x'))
+                        arb_y = int(entry_text(self, 'rot_y'))
+                    except ValueError:
+                        arb_x = arb_y = 0
+                matrix = rotation_about(arg, float(arb_x), float(arb_y))
+
+            def change():
+                references = self.view.centroids(selected) if centered else None
+                self.view.transform_objects(selected, matrix, references)
+            self.renderer.mutate(change)
 
         self.window.queue_draw()
 
+    def pan_window(self, dx: float, dy: float):
+        # desloca a window o equivalente a (dx, dy) pixels inteiros na tela,
+        # para que o frame anterior possa ser reaproveitado
+        linear = window_viewport_matrix(self.view.window, self.viewport())[:2, :2]
+        offset = np.array([dx, -dy]) @ np.linalg.inv(linear)
+        self.view.window.translate(Vetor2D(*offset))
+
     def selected_objs(self):
         tree = self.builder.get_object('tree_displayfiles')
         store, rows = tree.get_selection().get_selected_rows()
 
-        return (self.view.obj_list[int(str(index))] for index in rows)
+        # pelo id guardado na linha, não pela posição dela na lista
+        by_id = self.view.by_id
+        return [by_id[store[path][2]] for path in rows]
 
     def on_rotation_ref(self, widget: Gtk.RadioButton):
         for w in widget.get_group():
@@ -259,20 +465,35 @@ class MainWindowHandler:
                     for _id in 'rot_x', 'rot_y':
                         self.builder.get_object(_id).set_editable(True)
 
+    def onToggleStats(self, widget: Gtk.ToggleButton):
+        self.stats.overlay = widget.get_active()
+        # as estatísticas não entram na chave do pedido: sem isso a tabela
+        # só apareceria no próximo frame que mudasse alguma coisa
+        if self._renderer is not None:
+            self._renderer.invalidate()
+        self.window.queue_draw()
+
+    def onClippingMethod(self, widget: Gtk.ComboBoxText):
+        from clipping import LineClippingMethod
+        self.clipping_method = LineClippingMethod[widget.get_active_id()]
+        self.window.queue_draw()
+
     def onRotationWindow(self, widget: Gtk.Button):
         rotation_angle = int(entry_text(self, 'rot_window_entry'))
         self.view.window.angle += rotation_angle
-        for object in self.view.obj_list:
-            object.update_norm_coord(self.view.window)
         self.window.queue_draw()
 
 class AppWindow(Gtk.ApplicationWindow):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, startup: StartupReport = None, **kwargs):
         super().__init__(*args, **kwargs)
 
         builder = Gtk.Builder()
         builder.add_from_file("../interface/main_window.glade")
+        if startup is not None:
+            startup.mark('main_window.glade')
 
         self.window = builder.get_object("main_window")
 
-        builder.connect_signals(MainWindowHandler(builder))
+        builder.connect_signals(MainWindowHandler(builder, startup))
+        if startup is not None:
+            startup.mark('handlers')
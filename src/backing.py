@@ -0,0 +1,158 @@
+import cairo
+import numpy as np
+
+from typing import Callable, Optional, Tuple
+
+from clipping import LineClippingMethod
+from drawable import Rectangle, View
+from instrumentation import FrameStats
+from render import check_cancelled, paint_scene
+from transformations import viewport_matrix, window_viewport_matrix
+
+
+# Superfície com o último frame desenhado (sem a borda do viewport).
+# Enquanto só a posição da window muda, e por um número inteiro de pixels,
+# o frame anterior é deslocado e só as faixas que entraram no viewport
+# são desenhadas de novo. Zoom, rotação, mudança de tamanho ou de qualquer
+# objeto da cena pedem o frame inteiro.
+class BackingStore:
+    def __init__(self, executor: Optional['ParallelExecutor'] = None):
+        self.executor = executor
+        self.surface: Optional[cairo.Surface] = None
+        self.key = None
+        self.screen_matrix: Optional[np.ndarray] = None
+
+    def invalidate(self):
+        self.surface = None
+        self.key = None
+
+    def _key(self, view: View, viewport: Rectangle, size: Tuple[int, int], method):
+        # sem a identidade da window: a cópia que a thread de desenho
+        # recebe a cada frame ainda pode reaproveitar o anterior
+        window = view.window
+        return (
+            tuple(size), tuple(viewport.vertices[:, :2].ravel()),
+            window.width, window.height, window.angle,
+            id(view.store), view.store.version, method,
+        )
+
+    def _shift(self, screen_matrix: np.ndarray) -> Optional[Tuple[int, int]]:
+        # quanto o conteúdo andou na tela; None se não foi um número inteiro de pixels
+        if self.screen_matrix is None:
+            return None
+        origin = np.array([0.0, 0.0, 1.0]) @ np.linalg.inv(self.screen_matrix)
+        shift = (origin @ screen_matrix)[:2]
+        rounded = np.round(shift)
+        if np.abs(shift - rounded).max() > 1e-6:
+            return None
+        return int(rounded[0]), int(rounded[1])
+
+    def _exposed(self, viewport: Rectangle, dx: int, dy: int):
+        # faixas do viewport que o deslocamento deixou sem conteúdo
+        x0, y0 = int(viewport.min.x), int(viewport.min.y)
+        x1, y1 = int(viewport.max.x), int(viewport.max.y)
+        strips = []
+        if dx > 0:
+            strips.append((x0, y0, dx, y1 - y0))
+        elif dx < 0:
+            strips.append((x1 + dx, y0, -dx, y1 - y0))
+        if dy > 0:
+            strips.append((x0, y0, x1 - x0, dy))
+        elif dy < 0:
+            strips.append((x0, y1 + dy, x1 - x0, -dy))
+        return strips
+
+    def _world_bounds(self, rect, screen_matrix: np.ndarray):
+        x, y, w, h = rect
+        corners = np.array([
+            [x, y, 1],
+            [x + w, y, 1],
+            [x + w, y + h, 1],
+            [x, y + h, 1],
+        ], dtype=float) @ np.linalg.inv(screen_matrix)
+        return (*corners[:, :2].min(axis=0), *corners[:, :2].max(axis=0))
+
+    def _new_surface(self, target: Optional[cairo.Surface], size: Tuple[int, int]) -> cairo.Surface:
+        # sem alvo (fora da thread da interface) a superfície fica na memória
+        if target is None:
+            return cairo.ImageSurface(cairo.FORMAT_RGB24, *size)
+        return target.create_similar(cairo.CONTENT_COLOR, *size)
+
+    def _render(self, target, view, vp_matrix, size, method, stats, cancelled):
+        self.surface = self._new_surface(target, size)
+        paint_scene(
+            cairo.Context(self.surface), view, vp_matrix, method, stats,
+            executor=self.executor, cancelled=cancelled,
+        )
+
+    def _scroll(
+            self, target, view, viewport, vp_matrix, screen_matrix,
+            size, shift, method, stats, cancelled,
+    ):
+        dx, dy = shift
+        surface = self._new_surface(target, size)
+        ctx = cairo.Context(surface)
+        ctx.paint()
+
+        # o que continua visível vem do frame anterior; a margem fora
+        # do viewport nunca tem conteúdo e não é copiada
+        ctx.save()
+        ctx.rectangle(viewport.min.x, viewport.min.y, viewport.width, viewport.height)
+        ctx.clip()
+        ctx.set_source_surface(self.surface, dx, dy)
+        ctx.paint()
+        ctx.restore()
+
+        for rect in self._exposed(viewport, dx, dy):
+            ctx.save()
+            ctx.rectangle(*rect)
+            ctx.clip()
+            paint_scene(
+                ctx, view, vp_matrix, method, stats,
+                bounds=self._world_bounds(rect, screen_matrix),
+                executor=self.executor,
+                cancelled=cancelled,
+            )
+            ctx.restore()
+
+        self.surface = surface
+
+    def update(
+            self,
+            target: Optional[cairo.Surface],
+            view: View,
+            viewport: Rectangle,
+            size: Tuple[int, int],
+            method=LineClippingMethod.COHEN_SUTHERLAND,
+            stats: Optional[FrameStats] = None,
+            cancelled: Optional[Callable[[], bool]] = None,
+    ) -> cairo.Surface:
+        # o frame atual, sem a borda do viewport; se `cancelled` interromper
+        # o desenho (FrameCancelled), a superfície fica inválida
+        vp_matrix = viewport_matrix(viewport)
+        view.set_viewport(viewport)
+        size = tuple(int(v) for v in size)
+
+        # o nível de detalhe das curvas pode reescrever vértices e mudar
+        # a versão da cena, então é atualizado antes da comparação
+        view.refresh_level_of_detail()
+        view.refresh()
+        check_cancelled(cancelled)
+        screen_matrix = window_viewport_matrix(view.window, viewport)
+        key = self._key(view, viewport, size, method)
+        shift = self._shift(screen_matrix) if key == self.key and self.surface else None
+
+        if shift is None or abs(shift[0]) >= size[0] or abs(shift[1]) >= size[1]:
+            self._render(target, view, vp_matrix, size, method, stats, cancelled)
+            if stats is not None:
+                stats.count('blit', 0)
+        elif shift != (0, 0):
+            self._scroll(
+                target, view, viewport, vp_matrix, screen_matrix,
+                size, shift, method, stats, cancelled,
+            )
+            if stats is not None:
+                stats.count('blit', 1)
+        self.key = key
+        self.screen_matrix = screen_matrix
+        return self.surface
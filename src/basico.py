@@ -1,11 +1,14 @@
 # Created by Ana Cristina Medaglia Dyonisio
 
+import time
+STARTED = time.perf_counter()
+
+import os
 import sys
 import gi
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk
 gi.require_foreign("cairo")
-from appwindow import AppWindow
 
 class Application(Gtk.Application):
     def __init__(self, *args, **kwargs):
@@ -19,7 +22,15 @@ class Application(Gtk.Application):
     def do_activate(self):
         # We only allow a single window and raise any existing ones
         if not self.window:
-            app_window = AppWindow(application=self, title="Sistema Básico")
+            # a janela e a geometria só são carregadas depois que o Gtk
+            # registrou a aplicação
+            from instrumentation import StartupReport
+            # SB_STARTUP_REPORT=1 mostra o tempo de cada fase da abertura
+            startup = StartupReport(STARTED, enabled=bool(os.environ.get('SB_STARTUP_REPORT')))
+            startup.mark('gtk')
+            from appwindow import AppWindow
+            startup.mark('appwindow')
+            app_window = AppWindow(application=self, title="Sistema Básico", startup=startup)
             # Windows are associated with the application
             # when the last one is closed the application shuts down
             self.window = app_window.window
@@ -0,0 +1,2 @@
+# Benchmarks do pipeline de desenho sobre cenas sintéticas.
+# Rodar a partir de src/:  python -m benchmarks --output resultado.json
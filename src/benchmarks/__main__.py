@@ -0,0 +1,175 @@
+import argparse
+import atexit
+import json
+import platform
+import subprocess
+import sys
+import time
+import timeit
+
+import numpy as np
+
+from clipping import (
+    LineClippingMethod,
+    curve_clipping,
+    line_clip,
+    line_clip_batch,
+    poly_clipping,
+)
+from drawable import Curve, Line, Polygon
+from benchmarks import scenes
+
+SIZES = [10**2, 10**3, 10**4, 10**5, 10**6]
+
+
+def measure(function, repeat: int) -> dict:
+    times = timeit.repeat(function, number=1, repeat=repeat)
+    return {
+        'min': min(times),
+        'median': float(np.median(times)),
+        'repeat': repeat,
+    }
+
+
+def bench_update_norm_coord(n_vertices):
+    view = scenes.scene(n_vertices)
+    return view, lambda: view.update_norm_coord()
+
+
+def bench_line_clip(n_vertices, method):
+    view = scenes.scene(n_vertices, kinds=('line',))
+    view.update_norm_coord()
+    lines = scenes.objects_of(view, Line)
+    return view, lambda: line_clip_batch(*view.normalized_endpoints(lines), method=method)
+
+
+def bench_line_clip_scalar(n_vertices, method):
+    view = scenes.scene(n_vertices, kinds=('line',))
+    view.update_norm_coord()
+    lines = scenes.objects_of(view, Line)
+    return view, lambda: [line_clip(line, method) for line in lines]
+
+
+def bench_poly_clipping(n_vertices):
+    view = scenes.scene(n_vertices, kinds=('polygon',))
+    view.update_norm_coord()
+    polygons = scenes.objects_of(view, Polygon)
+    return view, lambda: [poly_clipping(p) for p in polygons]
+
+
+def bench_curve_clipping(n_vertices):
+    view = scenes.scene(n_vertices, kinds=('curve',))
+    view.update_norm_coord()
+    curves = scenes.objects_of(view, Curve)
+    return view, lambda: [curve_clipping(c) for c in curves]
+
+
+def bench_control_point(n_vertices):
+    # uma curva só, com vértices tesselados ~ n_vertices
+    n_segments = max(n_vertices // scenes.CURVE_POINTS, 1)
+    rng = np.random.default_rng(0)
+    points = np.ones((3 * n_segments + 1, 3))
+    points[:, :2] = np.cumsum(rng.normal(0, 30, (len(points), 2)), axis=0)
+    return None, lambda: Curve.control_point(points, n_points=scenes.CURVE_POINTS)
+
+
+def bench_frame(n_vertices, size=(800, 600)):
+    from offscreen import render
+
+    view = scenes.scene(n_vertices)
+    # a window muda a cada frame, como numa navegação
+    def frame():
+        view.window.angle += 1
+        render(view, size=size)
+    return view, frame
+
+
+def bench_clip_frame(n_vertices, parallel=False):
+    from parallel import ParallelExecutor
+    from render import clip_frame, viewport_rect
+
+    view = scenes.scene(n_vertices)
+    view.set_viewport(viewport_rect(800, 600))
+    executor = None
+    if parallel:
+        executor = ParallelExecutor(threshold=0)
+        atexit.register(executor.close)
+        # o primeiro uso sobe os processos, fora da medição
+        clip_frame(view, executor=executor)
+    return view, lambda: clip_frame(view, executor=executor)
+
+
+BENCHMARKS = {
+    'update_norm_coord': bench_update_norm_coord,
+    'line_clip_batch.cohen_sutherland': lambda n: bench_line_clip(n, LineClippingMethod.COHEN_SUTHERLAND),
+    'line_clip_batch.liang_barsky': lambda n: bench_line_clip(n, LineClippingMethod.LIANG_BARSKY),
+    'line_clip.cohen_sutherland': lambda n: bench_line_clip_scalar(n, LineClippingMethod.COHEN_SUTHERLAND),
+    'poly_clipping': bench_poly_clipping,
+    'curve_clipping': bench_curve_clipping,
+    'Curve.control_point': bench_control_point,
+    'frame': bench_frame,
+    'clip_frame': bench_clip_frame,
+    'clip_frame.parallel': lambda n: bench_clip_frame(n, parallel=True),
+}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def run(names, sizes, repeat) -> dict:
+    results = []
+    for name in names:
+        for n_vertices in sizes:
+            view, function = BENCHMARKS[name](n_vertices)
+            result = {
+                'name': name,
+                'vertices': n_vertices,
+                'objects': len(view.obj_list) if view is not None else 1,
+                # os geradores chegam perto de `vertices`, mas não exatamente
+                'scene_vertices': (
+                    int(view.store.lengths[:view.store.count].sum())
+                    if view is not None else n_vertices
+                ),
+            }
+            result.update(measure(function, repeat))
+            results.append(result)
+            print(
+                f"{name:36} {n_vertices:>9} {result['median'] * 1000:10.3f} ms",
+                file=sys.stderr,
+            )
+    return {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='benchmarks')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument('--output', help='arquivo JSON (padrão: saída padrão)')
+    args = parser.parse_args(argv)
+
+    report = run(args.only, args.sizes, args.repeat)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+import numpy as np
+
+from typing import List, Tuple
+
+from drawable import Curve, GraphicObject, Line, Point, Polygon, Vetor2D, View, Window
+from tessellation import tessellate
+
+# vértices aproximados de cada tipo de objeto gerado
+POLYGON_SIZE = 8
+CURVE_CONTROL_POINTS = 7
+CURVE_POINTS = 20
+
+
+def _world_size(n_vertices: int) -> float:
+    # densidade constante: a cena cresce com o número de vértices
+    return 50.0 * np.sqrt(n_vertices)
+
+
+# cada gerador devolve os objetos, ainda sem vértices, e os vértices de
+# todos eles enfileirados com o tamanho de cada bloco, como View.add_objects
+# recebe
+Generated = Tuple[List[GraphicObject], np.ndarray, np.ndarray]
+
+
+def _homogeneous(xy: np.ndarray) -> np.ndarray:
+    vertices = np.ones((len(xy), 3))
+    vertices[:, :2] = xy
+    return vertices
+
+
+def points(n_vertices: int, rng: np.random.Generator) -> Generated:
+    size = _world_size(n_vertices)
+    vertices = _homogeneous(rng.uniform(-size, size, (n_vertices, 2)))
+    objects = [Point.empty(f'p{i}') for i in range(n_vertices)]
+    return objects, vertices, np.ones(n_vertices, dtype=np.int64)
+
+
+def lines(n_vertices: int, rng: np.random.Generator) -> Generated:
+    size = _world_size(n_vertices)
+    inicio = rng.uniform(-size, size, (n_vertices // 2, 2))
+    fim = inicio + rng.normal(0, 40, inicio.shape)
+    vertices = _homogeneous(np.stack([inicio, fim], axis=1).reshape(-1, 2))
+    objects = [Line.empty(f'l{i}') for i in range(len(inicio))]
+    return objects, vertices, np.full(len(inicio), 2, dtype=np.int64)
+
+
+def polygons(n_vertices: int, rng: np.random.Generator) -> Generated:
+    size = _world_size(n_vertices)
+    count = max(n_vertices // POLYGON_SIZE, 1)
+    centers = rng.uniform(-size, size, (count, 2))
+    angles = np.sort(rng.uniform(0, 2 * np.pi, (count, POLYGON_SIZE)), axis=1)
+    radii = rng.uniform(5, 60, (count, 1))
+
+    vertices = np.ones((count, POLYGON_SIZE, 3))
+    vertices[:, :, 0] = centers[:, :1] + radii * np.cos(angles)
+    vertices[:, :, 1] = centers[:, 1:] + radii * np.sin(angles)
+    objects = [Polygon.empty(f'poly{i}', filled=bool(i % 2)) for i in range(count)]
+    return objects, vertices.reshape(-1, 3), np.full(count, POLYGON_SIZE, dtype=np.int64)
+
+
+def control_points(count: int, size: float, rng: np.random.Generator) -> np.ndarray:
+    start = rng.uniform(-size, size, (count, 1, 2))
+    steps = rng.normal(0, 30, (count, CURVE_CONTROL_POINTS, 2))
+    points = np.ones((count, CURVE_CONTROL_POINTS, 3))
+    points[:, :, :2] = start + np.cumsum(steps, axis=1)
+    return points
+
+
+def curve_size(type: str) -> int:
+    # vértices tesselados de uma curva de CURVE_CONTROL_POINTS pontos
+    return len(tessellate(np.ones((CURVE_CONTROL_POINTS, 3)), type, CURVE_POINTS))
+
+
+def curves(n_vertices: int, rng: np.random.Generator) -> Generated:
+    size = _world_size(n_vertices)
+    # B-splines e Bezier alternadas; com os mesmos pontos de controle a
+    # B-spline tem mais segmentos, então o par é que dá o tamanho
+    pair = curve_size('bspline') + curve_size('bezier')
+    count = max(2 * n_vertices // pair, 1)
+    objects = [
+        Curve.control_point(
+            cp,
+            type='bezier' if i % 2 else 'bspline',
+            name=f'c{i}',
+            n_points=CURVE_POINTS,
+        )
+        for i, cp in enumerate(control_points(count, size, rng))
+    ]
+    lengths = np.fromiter((len(c.vertices) for c in objects), dtype=np.int64, count=count)
+    return objects, np.concatenate([c.vertices for c in objects]), lengths
+
+
+GENERATORS = {
+    'point': points,
+    'line': lines,
+    'polygon': polygons,
+    'curve': curves,
+}
+
+
+def window_for(n_vertices: int, fraction: float = 0.25) -> Window:
+    # window cobrindo `fraction` da largura da cena
+    half = _world_size(n_vertices) * fraction
+    return Window(Vetor2D(-half, -half * 0.75), Vetor2D(half, half * 0.75))
+
+
+def scene(n_vertices: int, kinds=tuple(GENERATORS), seed: int = 0) -> View:
+    # os vértices são divididos igualmente entre os tipos pedidos
+    rng = np.random.default_rng(seed)
+    view = View(window=window_for(n_vertices))
+    share = max(n_vertices // len(kinds), 1)
+    objects, vertices, lengths = [], [], []
+    for kind in kinds:
+        generated = GENERATORS[kind](share, rng)
+        objects.extend(generated[0])
+        vertices.append(generated[1])
+        lengths.append(generated[2])
+    view.add_objects(objects, np.concatenate(vertices), np.concatenate(lengths))
+    return view
+
+
+def objects_of(view: View, cls) -> List[GraphicObject]:
+    return [o for o in view.obj_list if isinstance(o, cls)]
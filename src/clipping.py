@@ -1,11 +1,12 @@
 from enum import auto, Enum
-from typing import List, Optional
-import copy
+from typing import Optional, Tuple
+import numpy as np
 
-from drawable import Line, Vetor2D, Polygon
+from drawable import ClippedGeometry, Curve, Line, Polygon
 
 class LineClippingMethod(Enum):
     COHEN_SUTHERLAND = auto()
+    LIANG_BARSKY = auto()
 
 class CohenRegion:
     INSIDE = 0b0000
@@ -15,182 +16,308 @@ class CohenRegion:
     TOP = 0b1000
 
     @classmethod
-    def region(cls, v: Vetor2D) -> 'CohenRegion':
+    def region(cls, x: float, y: float) -> int:
         region = CohenRegion.INSIDE
-        if v.x < -1:
+        if x < -1:
             region |= CohenRegion.LEFT
-        elif v.x > 1:
+        elif x > 1:
             region |= CohenRegion.RIGHT
 
-        if v.y > 1:
+        if y > 1:
             region |= CohenRegion.TOP
-        elif v.y < -1:
+        elif y < -1:
             region |= CohenRegion.BOTTOM
 
         return region
 
-def cohen_sutherland_line_clip(line: Line) -> Line:
-    nova_linha = copy.deepcopy(line)
-    inicio, fim = nova_linha.normalized_vertices
-    regions = [
-        CohenRegion.region(v)
-        for v in (inicio, fim)
-    ]
+    @classmethod
+    def regions(cls, points: np.ndarray) -> np.ndarray:
+        x = points[:, 0]
+        y = points[:, 1]
+        regions = np.zeros(len(points), dtype=np.int8)
+        regions[x < -1] |= CohenRegion.LEFT
+        regions[x > 1] |= CohenRegion.RIGHT
+        regions[y > 1] |= CohenRegion.TOP
+        regions[y < -1] |= CohenRegion.BOTTOM
+        return regions
+
+def cohen_sutherland_line_clip(line: Line) -> Optional[ClippedGeometry]:
+    # em floats, sem arrays por ponta ou interseção
+    (x0, y0, _), (x1, y1, _) = line.normalized_vertices.tolist()
+    points = [[x0, y0], [x1, y1]]
+    regions = [CohenRegion.region(x0, y0), CohenRegion.region(x1, y1)]
 
     while True:
         # dois pontos dentro
-        if all([r == CohenRegion.INSIDE for r in regions]):
-            return nova_linha
+        if regions[0] == regions[1] == CohenRegion.INSIDE:
+            (x0, y0), (x1, y1) = points
+            return ClippedGeometry(line, np.array([[x0, y0, 1.0], [x1, y1, 1.0]]))
         # dois pontos fora
         elif regions[0] & regions[1] != 0:
             return
 
         clip_index = 0 if regions[0] != CohenRegion.INSIDE else 1
 
-        dx, dy, _ = fim - inicio
-        m = dx / dy
+        (x0, y0), (x1, y1) = points
+        dx, dy = x1 - x0, y1 - y0
+        region = regions[clip_index]
 
-        if regions[clip_index] & CohenRegion.TOP != 0:
-            x = inicio.x + m * (1 - inicio.y)
+        if region & CohenRegion.TOP != 0:
+            x = x0 + dx * (1 - y0) / dy
             y = 1
-        elif regions[clip_index] & CohenRegion.BOTTOM != 0:
-            x = inicio.x + m * (-1 - inicio.y)
+        elif region & CohenRegion.BOTTOM != 0:
+            x = x0 + dx * (-1 - y0) / dy
             y = -1
-        elif regions[clip_index] & CohenRegion.RIGHT != 0:
+        elif region & CohenRegion.RIGHT != 0:
             x = 1
-            y = inicio.y + (1 - inicio.x) / m
-        elif regions[clip_index] & CohenRegion.LEFT != 0:
+            y = y0 + dy * (1 - x0) / dx
+        elif region & CohenRegion.LEFT != 0:
             x = -1
-            y = inicio.y + (-1 - inicio.x) / m
+            y = y0 + dy * (-1 - x0) / dx
+
+        points[clip_index] = [x, y]
+        regions[clip_index] = CohenRegion.region(x, y)
+
+def liang_barsky_line_clip(line: Line) -> Optional[ClippedGeometry]:
+    (x0, y0, _), (x1, y1, _) = line.normalized_vertices.tolist()
+    dx = x1 - x0
+    dy = y1 - y0
+
+    # parâmetros das quatro bordas: esquerda, direita, baixo, cima
+    p = (-dx, dx, -dy, dy)
+    q = (x0 + 1, 1 - x0, y0 + 1, 1 - y0)
 
-        if clip_index == 0:
-            inicio = Vetor2D(x, y)
-            nova_linha.normalized_vertices[0] = inicio
-            regions[0] = CohenRegion.region(inicio)
+    u1, u2 = 0.0, 1.0
+    for pk, qk in zip(p, q):
+        if pk == 0:
+            # paralela à borda e do lado de fora
+            if qk < 0:
+                return
+        elif pk < 0:
+            u1 = max(u1, qk / pk)
         else:
-            fim = Vetor2D(x, y)
-            nova_linha.normalized_vertices[1] = fim
-            regions[1] = CohenRegion.region(fim)
+            u2 = min(u2, qk / pk)
 
-def line_clip(line: Line, method=LineClippingMethod.COHEN_SUTHERLAND) -> Optional[Line]:
+    if u1 > u2:
+        return
+
+    return ClippedGeometry(line, np.array([
+        [x0 + u1 * dx, y0 + u1 * dy, 1.0],
+        [x0 + u2 * dx, y0 + u2 * dy, 1.0],
+    ]))
+
+def line_clip(line: Line, method=LineClippingMethod.COHEN_SUTHERLAND) -> Optional[ClippedGeometry]:
     METHODS = {
-        LineClippingMethod.COHEN_SUTHERLAND: cohen_sutherland_line_clip
+        LineClippingMethod.COHEN_SUTHERLAND: cohen_sutherland_line_clip,
+        LineClippingMethod.LIANG_BARSKY: liang_barsky_line_clip,
     }
     return METHODS[method](line)
 
-def poly_iter(vertices: List[Vetor2D]):
-    if not vertices:
-        return
-    v1 = vertices[0]
-    for v2 in vertices[1:]:
-        yield v1, v2
-        v1 = v2
-    yield v1, vertices[0]
-
-def poly_clipping(poly: Polygon) -> Optional[Polygon]:
-    novo_poligono = copy.deepcopy(poly)
-
-    def clip_region(vertices, clipping_region):
-        clipped = []
-        for v1, v2 in poly_iter(vertices):
-            regions = [ CohenRegion.region(v) & clipping_region for v in [v1, v2]]
-
-            if all([region != clipping_region for region in regions]):
-                clipped.extend([v1, v2])
-            elif all([region == clipping_region for region in regions]):
-                continue
-            elif any([region == clipping_region for region in regions]):
-                clip_index = 0 if regions[0] == clipping_region else 1
-
-                dx, dy, _ = v2 - v1
-                m = dx / dy
-
-                if clipping_region == CohenRegion.TOP:
-                    x = v1.x + m * (1 - v1.y)
-                    y = 1
-                elif clipping_region == CohenRegion.BOTTOM:
-                    x = v1.x + m * (-1 - v1.y)
-                    y = -1
-                elif clipping_region == CohenRegion.RIGHT:
-                    x = 1
-                    y = v1.y + (1 - v1.x) / m
-                elif clipping_region == CohenRegion.LEFT:
-                    x = -1
-                    y = v1.y + (-1 - v1.x) / m
-
-                if clip_index == 0:
-                    v1 = Vetor2D(x, y)
-                else:
-                    v2 = Vetor2D(x, y)
-                clipped.extend([v1, v2])
-        return clipped
-
-    regions = [
-        CohenRegion.LEFT,
-        CohenRegion.TOP,
-        CohenRegion.RIGHT,
-        CohenRegion.BOTTOM
-    ]
-    for region in regions:
-        novo_poligono.normalized_vertices = clip_region(
-            novo_poligono.normalized_vertices,
-            region
-        )
-    return novo_poligono
-
-def curve_clipping(curve):
-    nova_curva = copy.deepcopy(curve)
-
-    def clip_region(vertices, clipping_region):
-        clipped = []
-        for i in range(len(vertices) - 1):
-            v1 = vertices[i]
-            v2 = vertices[i + 1]
-
-            regions = [
-                CohenRegion.region(v) & clipping_region for v in [v1, v2]
-            ]
-
-            if all([region != clipping_region for region in regions]):
-                clipped.extend([v1, v2])
-            elif all([region == clipping_region for region in regions]):
-                continue
-            elif any([region == clipping_region for region in regions]):
-                clip_index = 0 if regions[0] == clipping_region else 1
-
-                dx, dy, _ = v2 - v1
-                m = dx / dy
-
-                if clipping_region == CohenRegion.TOP:
-                    x = v1.x + m * (1 - v1.y)
-                    y = 1
-                elif clipping_region == CohenRegion.BOTTOM:
-                    x = v1.x + m * (-1 - v1.y)
-                    y = -1
-                elif clipping_region == CohenRegion.RIGHT:
-                    x = 1
-                    y = v1.y + (1 - v1.x) / m
-                elif clipping_region == CohenRegion.LEFT:
-                    x = -1
-                    y = v1.y + (-1 - v1.x) / m
-
-                if clip_index == 0:
-                    v1 = Vetor2D(x, y)
-                else:
-                    v2 = Vetor2D(x, y)
-                clipped.extend([v1, v2])
-        return clipped
-
-    regions = [
-        CohenRegion.LEFT,
-        CohenRegion.TOP,
-        CohenRegion.RIGHT,
-        CohenRegion.BOTTOM
-    ]
-    for region in regions:
-        nova_curva.normalized_vertices = clip_region(
-            nova_curva.normalized_vertices,
-            region
-        )
-
-    return nova_curva
\ No newline at end of file
+def cohen_sutherland_batch_clip(
+        inicio: np.ndarray,
+        fim: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    inicio = np.array(inicio, dtype=float).reshape(-1, 3)
+    fim = np.array(fim, dtype=float).reshape(-1, 3)
+    regions = [CohenRegion.regions(inicio), CohenRegion.regions(fim)]
+    keep = np.ones(len(inicio), dtype=bool)
+    active = np.arange(len(inicio))
+
+    # cada passo leva uma das pontas para uma borda, então
+    # em no máximo 4 passos por ponta todas as linhas terminam
+    for _ in range(8):
+        r0 = regions[0][active]
+        r1 = regions[1][active]
+        # dois pontos fora
+        rejected = r0 & r1 != 0
+        keep[active[rejected]] = False
+        # dois pontos dentro saem do lote
+        pending = ~rejected & (r0 | r1 != 0)
+        active = active[pending]
+        if not len(active):
+            break
+
+        r0 = r0[pending]
+        first = r0 != CohenRegion.INSIDE
+        region = np.where(first, r0, r1[pending])
+
+        x0, y0 = inicio[active, 0], inicio[active, 1]
+        dx = fim[active, 0] - x0
+        dy = fim[active, 1] - y0
+
+        top = region & CohenRegion.TOP != 0
+        right = region & CohenRegion.RIGHT != 0
+        vertical = top | (region & CohenRegion.BOTTOM != 0)
+        edge_y = np.where(top, 1.0, -1.0)
+        edge_x = np.where(right, 1.0, -1.0)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x = np.where(vertical, x0 + dx * (edge_y - y0) / dy, edge_x)
+            y = np.where(vertical, edge_y, y0 + dy * (edge_x - x0) / dx)
+
+        for clip_index, mask in ((0, first), (1, ~first)):
+            points = (inicio, fim)[clip_index]
+            index = active[mask]
+            points[index, 0] = x[mask]
+            points[index, 1] = y[mask]
+            regions[clip_index][index] = CohenRegion.regions(points[index])
+
+    index = np.flatnonzero(keep)
+    return inicio[index], fim[index], index
+
+def liang_barsky_batch_clip(
+        inicio: np.ndarray,
+        fim: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    inicio = np.asarray(inicio, dtype=float).reshape(-1, 3)
+    fim = np.asarray(fim, dtype=float).reshape(-1, 3)
+    dx = fim[:, 0] - inicio[:, 0]
+    dy = fim[:, 1] - inicio[:, 1]
+
+    p = np.stack([-dx, dx, -dy, dy], axis=1)
+    q = np.stack([
+        inicio[:, 0] + 1,
+        1 - inicio[:, 0],
+        inicio[:, 1] + 1,
+        1 - inicio[:, 1],
+    ], axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = q / p
+
+    u1 = np.where(p < 0, r, 0.0).max(axis=1)
+    u2 = np.where(p > 0, r, 1.0).min(axis=1)
+    outside = np.any((p == 0) & (q < 0), axis=1)
+
+    index = np.flatnonzero(~outside & (u1 <= u2))
+    u1, u2 = u1[index, None], u2[index, None]
+    origem = inicio[index]
+    direcao = np.stack([dx[index], dy[index], np.zeros(len(index))], axis=1)
+    return origem + u1 * direcao, origem + u2 * direcao, index
+
+def line_clip_batch(
+        inicio: np.ndarray,
+        fim: np.ndarray,
+        method=LineClippingMethod.COHEN_SUTHERLAND,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    METHODS = {
+        LineClippingMethod.COHEN_SUTHERLAND: cohen_sutherland_batch_clip,
+        LineClippingMethod.LIANG_BARSKY: liang_barsky_batch_clip,
+    }
+    return METHODS[method](inicio, fim)
+
+# bordas da window normalizada na ordem do recorte: (eixo, coordenada)
+CLIPPING_EDGES = (
+    (0, -1.0),  # esquerda
+    (1, 1.0),   # cima
+    (0, 1.0),   # direita
+    (1, -1.0),  # baixo
+)
+
+# separa os trechos visíveis de uma curva recortada
+BREAK = np.full((1, 3), np.nan)
+
+def polygon_clip(vertices: np.ndarray) -> np.ndarray:
+    # Sutherland-Hodgman, com cada borda aplicada a todas as arestas de uma vez
+    vertices = np.asarray(vertices, dtype=float)
+    for axis, edge in CLIPPING_EDGES:
+        if not len(vertices):
+            break
+        # aresta (anterior -> atual) termina em cada vértice
+        anterior = np.roll(vertices, 1, axis=0)
+        inside = vertices[:, axis] * edge <= 1
+        crossing = inside != np.roll(inside, 1)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = (edge - anterior[:, axis]) / (vertices[:, axis] - anterior[:, axis])
+            intersection = anterior + t[:, None] * (vertices - anterior)
+
+        candidates = np.stack([intersection, vertices], axis=1)
+        vertices = candidates[np.stack([crossing, inside], axis=1)]
+    return vertices
+
+def polyline_clip(vertices: np.ndarray) -> np.ndarray:
+    vertices = np.asarray(vertices, dtype=float)
+    inicio, fim, index = liang_barsky_batch_clip(vertices[:-1], vertices[1:])
+    if not len(index):
+        return index.reshape(0, 3).astype(float)
+
+    # um segmento continua o trecho do anterior só se os dois são
+    # consecutivos e o vértice que eles dividem está dentro da window;
+    # senão a curva saiu e voltou, e o trecho novo começa no ponto de entrada
+    shared = vertices[index, :2]
+    inside = np.all((shared >= -1) & (shared <= 1), axis=1)
+    starts = np.flatnonzero((np.diff(index, prepend=-2) != 1) | ~inside)
+    ends = np.append(starts[1:], len(index))
+    parts = []
+    for start, end in zip(starts, ends):
+        if parts:
+            parts.append(BREAK)
+        parts.append(inicio[start:start + 1])
+        parts.append(fim[start:end])
+    return np.concatenate(parts)
+
+def clip_polygon_vertices(vertices: np.ndarray, ndc_bounds: np.ndarray) -> Optional[np.ndarray]:
+    xmin, ymin, xmax, ymax = ndc_bounds
+    # todo dentro da window
+    if xmin >= -1 and ymin >= -1 and xmax <= 1 and ymax <= 1:
+        return vertices
+    # todo além de uma das bordas
+    if xmin > 1 or xmax < -1 or ymin > 1 or ymax < -1:
+        return None
+
+    vertices = polygon_clip(vertices)
+    return vertices if len(vertices) else None
+
+def poly_clipping(poly: Polygon) -> Optional[ClippedGeometry]:
+    vertices = clip_polygon_vertices(poly.normalized_vertices, poly.ndc_bounds)
+    return ClippedGeometry(poly, vertices) if vertices is not None else None
+
+def clip_curve_vertices(
+        vertices: np.ndarray,
+        hulls: Optional[np.ndarray],
+        offsets: Optional[np.ndarray],
+) -> Optional[np.ndarray]:
+    if hulls is None:
+        vertices = polyline_clip(vertices)
+        return vertices if len(vertices) else None
+
+    inside = np.all((hulls >= -1) & (hulls <= 1), axis=1)
+    outside = (
+        (hulls[:, 0] > 1) | (hulls[:, 2] < -1)
+        | (hulls[:, 1] > 1) | (hulls[:, 3] < -1)
+    )
+    if inside.all():
+        return vertices
+    if outside.all():
+        return None
+
+    # só os segmentos que cruzam a window passam pelo clipping; sequências
+    # de segmentos na mesma situação são tratadas juntas
+    state = np.where(inside, 1, np.where(outside, 0, 2))
+    starts = np.flatnonzero(np.diff(state, prepend=-1) != 0)
+    ends = np.append(starts[1:], len(state))
+
+    parts = []
+    for start, end in zip(starts, ends):
+        if state[start] == 0:
+            continue
+        # inclui o último vértice do segmento anterior, que fecha a
+        # primeira aresta deste trecho
+        first = max(offsets[start] - 1, 0)
+        piece = vertices[first:offsets[end]]
+        if state[start] == 2:
+            piece = polyline_clip(piece)
+        if len(piece):
+            if parts:
+                parts.append(BREAK)
+            parts.append(np.asarray(piece))
+
+    return np.concatenate(parts) if parts else None
+
+def curve_clipping(curve: Curve) -> Optional[ClippedGeometry]:
+    vertices = clip_curve_vertices(
+        curve.normalized_vertices,
+        curve.segment_hulls(),
+        curve.segment_offsets,
+    )
+    return ClippedGeometry(curve, vertices) if vertices is not None else None
@@ -0,0 +1,337 @@
+import numpy as np
+
+from spatial import UniformGrid
+
+
+def ranges(offsets: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    # índices de todos os vértices dos blocos (offset, length), em ordem
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    starts = offsets - (np.cumsum(lengths) - lengths)
+    return np.repeat(starts, lengths) + np.arange(total)
+
+
+# Armazenamento colunar do display file: todos os vértices em coordenadas do
+# mundo ficam num único array (N, 3) e cada objeto é um bloco (offset, length)
+class VertexStore:
+    def __init__(self, capacity: int = 1024, slots: int = 64, index: UniformGrid = None):
+        self.world = np.empty((capacity, 3), dtype=float)
+        self.normalized = np.empty((capacity, 3), dtype=float)
+        self.offsets = np.empty(slots, dtype=np.int64)
+        self.lengths = np.empty(slots, dtype=np.int64)
+        # bounding box de cada objeto no mundo: xmin, ymin, xmax, ymax
+        self.bounds = np.empty((slots, 4), dtype=float)
+        # a mesma caixa em coordenadas normalizadas
+        self.ndc_bounds = np.empty((slots, 4), dtype=float)
+        # versão de cada objeto, e as versões do objeto e da window
+        # em que as coordenadas normalizadas foram calculadas
+        self.versions = np.empty(slots, dtype=np.int64)
+        self.norm_versions = np.empty(slots, dtype=np.int64)
+        self.norm_window = np.empty(slots, dtype=np.int64)
+        self.index = index
+        # objetos com transformações pendentes
+        self.dirty = set()
+        # objetos adotados que ainda não entraram no índice
+        self.unindexed = np.empty(0, dtype=np.int64)
+        # muda a cada alteração de qualquer objeto da cena
+        self.version = 0
+        self.size = 0
+        self.count = 0
+        self.garbage = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _reserve_vertices(self, n: int):
+        needed = self.size + n
+        if needed <= len(self.world):
+            return
+        if self.garbage and self.garbage >= self.size // 2:
+            self.compact()
+            if self.size + n <= len(self.world):
+                return
+        capacity = max(needed, 2 * len(self.world))
+        for attr in ('world', 'normalized'):
+            old = getattr(self, attr)
+            new = np.empty((capacity, 3), dtype=float)
+            new[:self.size] = old[:self.size]
+            setattr(self, attr, new)
+
+    def _reserve_slots(self, n: int):
+        needed = self.count + n
+        if needed <= len(self.offsets):
+            return
+        capacity = max(needed, 2 * len(self.offsets))
+        for attr in (
+                'offsets',
+                'lengths',
+                'bounds',
+                'ndc_bounds',
+                'versions',
+                'norm_versions',
+                'norm_window',
+        ):
+            old = getattr(self, attr)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, attr, new)
+
+    def _update_bounds(self, slot: int, vertices: np.ndarray):
+        if not len(vertices):
+            return
+        bounds = self.bounds[slot]
+        bounds[:2] = vertices[:, :2].min(axis=0)
+        bounds[2:] = vertices[:, :2].max(axis=0)
+        if self.index is not None:
+            self.index.update(slot, tuple(bounds))
+            self._refit_index()
+
+    def _refit_index(self):
+        # a grade acompanha a escala da cena; com objetos adotados ainda
+        # fora dela a conta não fecha, e a reconstrução espera
+        if len(self.unindexed) or not self.index.drifted():
+            return
+        slots = np.flatnonzero(self.lengths[:self.count] > 0)
+        self.index.rebuild(slots, self.bounds[slots])
+
+    def append(self, vertices: np.ndarray) -> int:
+        n = len(vertices)
+        self._reserve_vertices(n)
+        self._reserve_slots(1)
+
+        slot = self.count
+        self.offsets[slot] = self.size
+        self.lengths[slot] = n
+        self.world[self.size:self.size + n] = vertices
+        self.normalized[self.size:self.size + n] = vertices
+        self.versions[slot] = 0
+        self.norm_versions[slot] = self.norm_window[slot] = -1
+        self.size += n
+        self.count += 1
+        self.version += 1
+        self._update_bounds(slot, vertices)
+        return slot
+
+    def extend(self, vertices: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+        # vários objetos de uma vez, enfileirados num único bloco
+        n, k = len(vertices), len(lengths)
+        self._reserve_vertices(n)
+        self._reserve_slots(k)
+
+        slots = np.arange(self.count, self.count + k)
+        self.offsets[slots] = self.size + np.cumsum(lengths) - lengths
+        self.lengths[slots] = lengths
+        self.world[self.size:self.size + n] = vertices
+        self.normalized[self.size:self.size + n] = vertices
+        self.versions[slots] = 0
+        self.norm_versions[slots] = self.norm_window[slots] = -1
+        self.size += n
+        self.count += k
+        self.version += 1
+        self._set_bounds(slots)
+        return slots
+
+    def adopt(
+            self,
+            world: np.ndarray,
+            offsets: np.ndarray,
+            lengths: np.ndarray,
+            bounds: np.ndarray = None,
+    ) -> np.ndarray:
+        # passa a usar `world` como está, sem cópia (um memmap, por exemplo);
+        # pode haver buracos entre os blocos. As coordenadas normalizadas só
+        # são escritas, e as páginas só são lidas, quando cada objeto aparece
+        if self.count:
+            raise ValueError('adopt precisa de um display file vazio')
+        k = len(offsets)
+        self.world = world
+        self.normalized = np.empty(world.shape, dtype=float)
+        self._reserve_slots(k)
+
+        slots = np.arange(k)
+        self.offsets[:k] = offsets
+        self.lengths[:k] = lengths
+        self.versions[:k] = 0
+        self.norm_versions[:k] = self.norm_window[:k] = -1
+        self.size = len(world)
+        self.count = k
+        self.garbage = self.size - int(self.lengths[:k].sum())
+        self.version += 1
+        # o índice é montado aos poucos, por index_pending
+        self._set_bounds(slots, bounds, deferred=True)
+        return slots
+
+    def _set_bounds(self, slots: np.ndarray, bounds: np.ndarray = None, deferred: bool = False):
+        if bounds is None:
+            slots, mins, maxs = self._block_bounds(self.world, slots)
+            bounds = np.hstack([mins, maxs])
+        else:
+            keep = self.lengths[slots] > 0
+            slots, bounds = slots[keep], bounds[keep]
+        self.bounds[slots] = bounds
+        if self.index is None:
+            return
+        if not len(self.index) and not len(self.unindexed):
+            self.index.fit(bounds)
+        if deferred:
+            self.unindexed = np.concatenate([self.unindexed, slots])
+        else:
+            self.index.insert_many(slots, bounds)
+            self._refit_index()
+
+    def index_pending(self, limit: int = 16384) -> bool:
+        # mais um lote de objetos adotados para o índice; True enquanto faltar
+        slots, self.unindexed = self.unindexed[:limit], self.unindexed[limit:]
+        if len(slots):
+            # os que mudaram de forma nesse meio tempo já entraram
+            known = np.fromiter(
+                (slot in self.index for slot in slots.tolist()),
+                dtype=bool, count=len(slots),
+            )
+            slots = slots[~known]
+            self.index.insert_many(slots, self.bounds[slots])
+            self._refit_index()
+        return bool(len(self.unindexed))
+
+    def write(self, slot: int, vertices: np.ndarray):
+        n = len(vertices)
+        if n != self.lengths[slot]:
+            # tamanho mudou: o bloco antigo vira buraco e o novo vai pro fim
+            self._reserve_vertices(n)
+            self.garbage += int(self.lengths[slot])
+            self.offsets[slot] = self.size
+            self.lengths[slot] = n
+            self.size += n
+        start = self.offsets[slot]
+        self.world[start:start + n] = vertices
+        self.touch(slot)
+        self._update_bounds(slot, vertices)
+
+    def transform(self, slot: int, matrix: np.ndarray, norm_matrix: np.ndarray = None):
+        start = self.offsets[slot]
+        end = start + self.lengths[slot]
+        if norm_matrix is None:
+            self.world[start:end] = self.world[start:end] @ matrix
+        else:
+            # mundo e coordenadas normalizadas no mesmo produto
+            fused = self.world[start:end] @ np.hstack([matrix, matrix @ norm_matrix])
+            self.world[start:end] = fused[:, :3]
+            self.normalized[start:end] = fused[:, 3:]
+            if end > start:
+                self.ndc_bounds[slot, :2] = fused[:, 3:5].min(axis=0)
+                self.ndc_bounds[slot, 2:] = fused[:, 3:5].max(axis=0)
+        self.touch(slot)
+        self._update_bounds(slot, self.world[start:end])
+
+    def transform_many(self, slots: np.ndarray, matrix: np.ndarray, references: np.ndarray = None):
+        # a mesma matriz em vários objetos: um gather, um produto e um
+        # scatter; com `references` (x, y de cada objeto) ela é aplicada
+        # em torno do ponto de cada um
+        lengths = self.lengths[slots]
+        index = ranges(self.offsets[slots], lengths)
+        world = self.world[index]
+        if references is None:
+            world = world @ matrix
+        else:
+            shift = np.repeat(references, lengths, axis=0)
+            world[:, :2] -= shift
+            world = world @ matrix
+            world[:, :2] += shift
+        self.world[index] = world
+        self.versions[slots] += 1
+        self.version += 1
+
+        slots, mins, maxs = self._block_bounds(self.world, slots)
+        self.bounds[slots, :2] = mins
+        self.bounds[slots, 2:] = maxs
+        if self.index is not None:
+            for slot, bounds in zip(slots.tolist(), self.bounds[slots].tolist()):
+                self.index.update(slot, tuple(bounds))
+            self._refit_index()
+
+    def centroids(self, slots: np.ndarray) -> np.ndarray:
+        # (x, y) médio dos vértices de cada objeto
+        lengths = self.lengths[slots]
+        points = self.world[ranges(self.offsets[slots], lengths), :2]
+        owner = np.repeat(np.arange(len(slots)), lengths)
+        sums = np.stack([
+            np.bincount(owner, points[:, axis], minlength=len(slots))
+            for axis in (0, 1)
+        ], axis=1)
+        return sums / np.maximum(lengths, 1)[:, None]
+
+    def touch(self, slot: int):
+        self.versions[slot] += 1
+        self.version += 1
+
+    def world_of(self, slot: int) -> np.ndarray:
+        start = self.offsets[slot]
+        return self.world[start:start + self.lengths[slot]]
+
+    def normalized_of(self, slot: int) -> np.ndarray:
+        start = self.offsets[slot]
+        return self.normalized[start:start + self.lengths[slot]]
+
+    def update_norm_coord(self, matrix: np.ndarray, slot: int = None):
+        if slot is None:
+            np.matmul(
+                self.world[:self.size], matrix,
+                out=self.normalized[:self.size]
+            )
+            self._update_ndc_bounds(np.arange(self.count))
+        else:
+            start = self.offsets[slot]
+            end = start + self.lengths[slot]
+            np.matmul(self.world[start:end], matrix, out=self.normalized[start:end])
+            if end > start:
+                self.ndc_bounds[slot, :2] = self.normalized[start:end, :2].min(axis=0)
+                self.ndc_bounds[slot, 2:] = self.normalized[start:end, :2].max(axis=0)
+
+    def normalize(self, slots: np.ndarray, matrix: np.ndarray):
+        # só os objetos dados, num único gather/produto/scatter
+        index = ranges(self.offsets[slots], self.lengths[slots])
+        self.normalized[index] = self.world[index] @ matrix
+        self._update_ndc_bounds(slots)
+
+    def _block_bounds(self, array: np.ndarray, slots: np.ndarray):
+        # caixa de cada bloco não vazio de `array`
+        slots = slots[self.lengths[slots] > 0]
+        if not len(slots):
+            return slots, np.empty((0, 2)), np.empty((0, 2))
+        lengths = self.lengths[slots]
+        # blocos enfileirados sem buracos, para um reduceat só
+        points = array[ranges(self.offsets[slots], lengths), :2]
+        starts = np.cumsum(lengths) - lengths
+        return (
+            slots,
+            np.minimum.reduceat(points, starts),
+            np.maximum.reduceat(points, starts),
+        )
+
+    def _update_ndc_bounds(self, slots: np.ndarray):
+        slots, mins, maxs = self._block_bounds(self.normalized, slots)
+        self.ndc_bounds[slots, :2] = mins
+        self.ndc_bounds[slots, 2:] = maxs
+
+    def mark_normalized(self, slots, window_version: int):
+        self.norm_versions[slots] = self.versions[slots]
+        self.norm_window[slots] = window_version
+
+    def stale(self, slots: np.ndarray, window_version: int) -> np.ndarray:
+        # objetos cujas coordenadas normalizadas estão desatualizadas
+        return slots[
+            (self.norm_window[slots] != window_version)
+            | (self.norm_versions[slots] != self.versions[slots])
+        ]
+
+    def compact(self):
+        offsets = self.offsets[:self.count]
+        lengths = self.lengths[:self.count]
+        index = ranges(offsets, lengths)
+
+        self.world[:len(index)] = self.world[index]
+        self.normalized[:len(index)] = self.normalized[index]
+        self.offsets[:self.count] = np.cumsum(lengths) - lengths
+        self.size = len(index)
+        self.garbage = 0
@@ -1,129 +1,293 @@
+import copy
+import itertools
 import cairo
 import numpy as np
 
 from abc import ABC, abstractmethod
-from math import cos, sin, radians
+from collections import OrderedDict
+from math import ceil, cos, log2, sin, radians
 from dataclasses import dataclass
 from cairo import Context
-from typing import List, Optional
-
+from typing import List, Optional, Tuple
+
+from displayfile import VertexStore
+from spatial import UniformGrid
+from tessellation import (
+    BEZIER_MATRIX,
+    BSPLINE_MATRIX,
+    adaptive_tessellate,
+    segment_hulls,
+    segment_offsets,
+    tessellate
+)
 from transformations import (
-    rotation_matrix,
+    rotation_about,
+    scale_about,
     translate_matrix,
-    scale_matrix,
     normalized_matrix
 )
 
 
-class Vetor2D(np.ndarray):
-    def __new__(cls, x: float = 0, y: float = 0):
-        objeto = np.asarray([x, y, 1], dtype=float).view(cls)
-        return objeto
+class Vetor2D:
+    # um ponto avulso (entrada do usuário, extremos de retas e retângulos,
+    # centroides); os vértices dos objetos ficam em arrays (N, 3) comuns,
+    # e este objeto só é criado quando um ponto é pedido sozinho
+    __slots__ = ('x', 'y')
 
-    @property
-    def x(self) -> float:
-        return self[0]
+    def __init__(self, x: float = 0, y: float = 0):
+        self.x = float(x)
+        self.y = float(y)
 
-    @x.setter
-    def x(self, value):
-        self[0] = value
+    @classmethod
+    def of(cls, row) -> 'Vetor2D':
+        return cls(row[0], row[1])
 
-    @property
-    def y(self) -> float:
-        return self[1]
+    def __array__(self, dtype=None, copy=None):
+        return np.array((self.x, self.y, 1.0), dtype=dtype or float)
+
+    def __len__(self) -> int:
+        return 3
+
+    def __iter__(self):
+        return iter((self.x, self.y, 1.0))
+
+    def __getitem__(self, index):
+        return (self.x, self.y, 1.0)[index]
+
+    def __matmul__(self, matrix: np.ndarray) -> 'Vetor2D':
+        x, y, _ = np.array((self.x, self.y, 1.0)) @ matrix
+        return Vetor2D(x, y)
+
+    def __add__(self, other) -> 'Vetor2D':
+        return Vetor2D(self.x + other[0], self.y + other[1])
 
-    @y.setter
-    def y(self, value):
-        self[1] = value
+    def __sub__(self, other) -> 'Vetor2D':
+        return Vetor2D(self.x - other[0], self.y - other[1])
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Vetor2D):
+            return NotImplemented
+        return self.x == other.x and self.y == other.y
+
+    def __repr__(self) -> str:
+        return f'Vetor2D({self.x!r}, {self.y!r})'
+
+    def copy(self) -> 'Vetor2D':
+        return Vetor2D(self.x, self.y)
+
+
+def vertex_array(vertices) -> np.ndarray:
+    if (
+            type(vertices) is np.ndarray and vertices.dtype == float
+            and vertices.ndim == 2 and vertices.shape[1] == 3
+    ):
+        return vertices
+    return np.asarray(vertices, dtype=float).reshape(-1, 3)
+
+
+# vértices de quem ainda não tem nenhum, compartilhado
+NO_VERTICES = vertex_array(np.empty((0, 3)))
+NO_VERTICES.setflags(write=False)
 
 
 class GraphicObject(ABC):
     def __init__(self, vertices=[], name=''):
         super().__init__()
         self.name = name
-        self.vertices: List[Vetor2D] = vertices
-        self.normalized_vertices: List[Vetor2D] = vertices
+        # enquanto o objeto não está numa View ele guarda os próprios vértices;
+        # depois disso ele é só uma janela (slot) para o VertexStore da View
+        self._store: Optional[VertexStore] = None
+        self._slot: Optional[int] = None
+        # identificador estável, dado pela View quando o objeto entra nela
+        self.id: Optional[int] = None
+        self._vertices = vertex_array(vertices)
+        self._normalized = self._vertices
+        # transformações ainda não aplicadas aos vértices, já compostas
+        self._pending: Optional[np.ndarray] = None
+
+    @property
+    def vertices(self) -> np.ndarray:
+        if self._store is not None:
+            self._flush()
+            return self._store.world_of(self._slot)
+        return self._vertices
+
+    @vertices.setter
+    def vertices(self, value):
+        if self._store is not None:
+            self._discard_pending()
+            self._store.write(self._slot, vertex_array(value))
+        else:
+            self._vertices = vertex_array(value)
+
+    def _discard_pending(self):
+        self._pending = None
+        self._store.dirty.discard(self._slot)
+
+    def _flush(self, t_matrix: np.ndarray = None):
+        # aplica as transformações pendentes numa passada só pelos vértices,
+        # junto com a normalização quando ela é dada
+        if self._pending is None:
+            return False
+        self._store.transform(self._slot, self._pending, t_matrix)
+        self._discard_pending()
+        return True
+
+    @property
+    def normalized_vertices(self) -> np.ndarray:
+        if self._store is not None:
+            return self._store.normalized_of(self._slot)
+        return self._normalized
+
+    @normalized_vertices.setter
+    def normalized_vertices(self, value):
+        if self._store is not None:
+            self._store.normalized_of(self._slot)[:] = value
+        else:
+            self._normalized = vertex_array(value)
+
+    @property
+    def ndc_bounds(self) -> np.ndarray:
+        # xmin, ymin, xmax, ymax das coordenadas normalizadas
+        if self._store is not None:
+            return self._store.ndc_bounds[self._slot]
+        points = self._normalized[:, :2]
+        return np.concatenate([points.min(axis=0), points.max(axis=0)])
+
+    @classmethod
+    def empty(cls, name='', **attributes):
+        # objeto ainda sem vértices, que recebe o seu bloco em View.add_objects
+        object = cls.__new__(cls)
+        GraphicObject.__init__(object, vertices=NO_VERTICES, name=name)
+        object.__dict__.update(attributes)
+        return object
+
+    def _attach(self, store: VertexStore):
+        self._adopt(store, store.append(self._vertices))
+
+    def _adopt(self, store: VertexStore, slot: int):
+        self._slot = slot
+        self._store = store
+        self._vertices = self._normalized = None
+
+    def __deepcopy__(self, memo):
+        clone = copy.copy(self)
+        clone._store = clone._slot = None
+        clone._vertices = self.vertices.copy()
+        clone._normalized = self.normalized_vertices.copy()
+        return clone
 
     @abstractmethod
-    def draw(self, cr: cairo.Context, vp_matrix: np.ndarray):
+    def draw(self, cr: cairo.Context, vp_matrix: np.ndarray, vertices: np.ndarray = None):
         pass
 
     def transform(self, matrix: np.ndarray):
-        self.vertices = [v @ matrix for v in self.vertices]
+        if self._store is None:
+            self._vertices = self._vertices @ matrix
+            return
+        # só compõe a matriz; os vértices são atualizados no próximo desenho
+        self._pending = matrix if self._pending is None else self._pending @ matrix
+        self._store.dirty.add(self._slot)
+        self._store.touch(self._slot)
 
     def update_norm_coord(self, window: 'Window'):
+        # a versão antes da matriz: se a window mudar no meio, o objeto fica
+        # marcado com uma versão velha e é normalizado de novo
+        version = window.version
         t_matrix = normalized_matrix(window)
-        self.normalized_vertices = [v @ t_matrix for v in self.vertices]
+        if self._store is None:
+            self._normalized = self._vertices @ t_matrix
+            return
+        if not self._flush(t_matrix):
+            self._store.update_norm_coord(t_matrix, self._slot)
+        self._store.mark_normalized(self._slot, version)
 
     @property
-    def centroid(self):
-        return sum(self.vertices) / len(self.vertices)
+    def centroid(self) -> Vetor2D:
+        if self._store is None:
+            return Vetor2D.of(self._vertices.mean(axis=0))
+        # o centroide acompanha as transformações afins pendentes
+        centroid = self._store.world_of(self._slot).mean(axis=0)
+        if self._pending is not None:
+            centroid = centroid @ self._pending
+        return Vetor2D.of(centroid)
+
+    def _vertex(self, index: int) -> Vetor2D:
+        return Vetor2D.of(self.vertices[index])
+
+    def _set_vertex(self, index: int, value: Vetor2D):
+        if self._store is None:
+            self._vertices[index] = value
+            return
+        # pela escrita do bloco inteiro, para o display file saber da mudança
+        vertices = self.vertices.copy()
+        vertices[index] = value
+        self.vertices = vertices
 
     def translate(self, offset: Vetor2D):
         self.transform(translate_matrix(offset.x, offset.y))
 
     def scale(self, factor: Vetor2D):
-        cx = self.centroid.x
-        cy = self.centroid.y
-        t_matrix = (
-            translate_matrix(-cx, -cy) @
-            scale_matrix(factor.x, factor.y) @
-            translate_matrix(cx, cy)
-        )
-        self.transform(t_matrix)
+        centroid = self.centroid
+        self.transform(scale_about(factor.x, factor.y, centroid.x, centroid.y))
 
     def rotate(self, angle: float, reference: Vetor2D):
-        ref_x = reference.x
-        ref_y = reference.y
-        t_matrix = (
-                translate_matrix(-ref_x, -ref_y) @
-                rotation_matrix(angle) @
-                translate_matrix(ref_x, ref_y)
-        )
-        self.transform(t_matrix)
+        self.transform(rotation_about(angle, reference.x, reference.y))
+
+    def clipped(self, method=None) -> Optional['ClippedGeometry']:
+        return ClippedGeometry(self, self.normalized_vertices)
 
-    def clipped(self, method=None) -> Optional['GraphicObject']:
-        return self
+
+# resultado do clipping: só as coordenadas normalizadas recortadas,
+# desenhadas com o estilo do objeto de origem
+@dataclass
+class ClippedGeometry:
+    source: GraphicObject
+    normalized_vertices: np.ndarray
+
+    def draw(self, cr: cairo.Context, vp_matrix: np.ndarray):
+        self.source.draw(cr, vp_matrix, self.normalized_vertices)
 
 class Rectangle(GraphicObject):
     def __init__(self, min: Vetor2D, max: Vetor2D, name=''):
         super().__init__(vertices=[min, max], name=name)
 
     @property
-    def min(self):
-        return self.vertices[0]
+    def min(self) -> Vetor2D:
+        return self._vertex(0)
 
     @property
-    def max(self):
-        return self.vertices[1]
+    def max(self) -> Vetor2D:
+        return self._vertex(1)
 
     @min.setter
     def min(self, value: Vetor2D):
-        self.vertices[0] = value
+        self._set_vertex(0, value)
 
     @max.setter
     def max(self, value: Vetor2D):
-        self.vertices[1] = value
+        self._set_vertex(1, value)
 
     @property
     def width(self) -> float:
-        return self.max.x - self.min.x
+        (x0, _, _), (x1, _, _) = self.vertices
+        return x1 - x0
 
     @property
     def height(self) -> float:
-        return self.max.y - self.min.y
+        (_, y0, _), (_, y1, _) = self.vertices
+        return y1 - y0
 
-    def draw(self, cr: Context,  vp_matrix: np.ndarray):
-        _min = self.min
-        _max = self.max
+    def draw(self, cr: Context,  vp_matrix: np.ndarray, vertices: np.ndarray = None):
+        (x0, y0, _), (x1, y1, _) = self.vertices.tolist()
 
         cr.set_source_rgb(0.4, 0.4, 0.4)
-        cr.move_to(_min.x, _min.y)
+        cr.move_to(x0, y0)
         for x, y in [
-                (_max.x, _min.y),
-                (_max.x, _max.y),
-                (_min.x, _max.y),
-                (_min.x, _min.y),
+                (x1, y0),
+                (x1, y1),
+                (x0, y1),
+                (x0, y0),
         ]:
             cr.line_to(x, y)
             cr.move_to(x, y)
@@ -135,50 +299,349 @@ class Rectangle(GraphicObject):
             self.max - Vetor2D(margin, margin),
         )
 
+WINDOW_VERSIONS = itertools.count()
+
 class Window(Rectangle):
     def __init__(self, min: Vetor2D, max: Vetor2D, angle: float = 0.0):
+        # trocada a cada mudança, para saber quais coordenadas normalizadas
+        # ficaram velhas; o contador é global para que duas windows nunca
+        # tenham a mesma versão
+        self.version = next(WINDOW_VERSIONS)
         super().__init__(min, max)
         self.angle = angle
 
+    @property
+    def angle(self) -> float:
+        return self._angle
+
+    @angle.setter
+    def angle(self, value: float):
+        self._angle = value
+        self.version = next(WINDOW_VERSIONS)
+
+    @Rectangle.min.setter
+    def min(self, value: Vetor2D):
+        self._set_vertex(0, value)
+        self.version = next(WINDOW_VERSIONS)
+
+    @Rectangle.max.setter
+    def max(self, value: Vetor2D):
+        self._set_vertex(1, value)
+        self.version = next(WINDOW_VERSIONS)
+
+    def transform(self, matrix: np.ndarray):
+        super().transform(matrix)
+        self.version = next(WINDOW_VERSIONS)
+
+    def snapshot(self) -> 'Window':
+        # cópia do estado atual, com a mesma versão: as coordenadas
+        # normalizadas com uma continuam valendo para a outra; a versão é lida
+        # antes, então a cópia nunca é mais velha do que a versão que leva
+        version = self.version
+        window = Window(self.min, self.max, self.angle)
+        window.version = version
+        return window
+
+    def bounds(self):
+        # bounding box no mundo da window rotacionada
+        center = self.centroid
+        (x0, y0, _), (x1, y1, _) = self.vertices.tolist()
+        corners = np.array([
+            [x0, y0, 1],
+            [x1, y0, 1],
+            [x1, y1, 1],
+            [x0, y1, 1],
+        ]) @ rotation_about(self.angle, center.x, center.y)
+        return (*corners[:, :2].min(axis=0), *corners[:, :2].max(axis=0))
+
+# caches que View.snapshot compartilha com a View original: o que um frame
+# calcula na cópia continua valendo para os próximos
+@dataclass
+class _ViewCache:
+    lod_scale: Optional[float] = None
+    # (versão da window, matriz): numa tupla, trocada de uma vez
+    norm: Tuple[Optional[int], Optional[np.ndarray]] = (None, None)
+
 class View:
-    def __init__(self, obj_list : List[GraphicObject] = [], window: Window = None):
-        self.obj_list = obj_list
+    def __init__(self, obj_list: List[GraphicObject] = None, window: Window = None):
+        self.obj_list = []
         self.window = window
+        self.viewport: Optional[Rectangle] = None
+        self.curves: List['Curve'] = []
+        self.adaptive_curves: List['Curve'] = []
+        self._curve_slots = np.empty(0, dtype=np.int64)
+        self._cache = _ViewCache()
+        self.index = UniformGrid()
+        self.store = VertexStore(index=self.index)
+        # id -> objeto; ids não mudam nem são reaproveitados
+        self.by_id = {}
+        self._next_id = 0
+        for obj in obj_list or []:
+            self.add_object(obj)
 
     def add_object(self, object: GraphicObject):
-        object.update_norm_coord(self.window)
+        object._attach(self.store)
+        self._identify([object])
+        if isinstance(object, Curve) and object.control_points is not None:
+            self.curves.append(object)
+            self._curve_slots = np.append(self._curve_slots, object._slot)
+        if isinstance(object, Curve) and object.adaptive:
+            self.adaptive_curves.append(object)
+            scale = self.pixel_scale()
+            if scale is not None:
+                object.level_of_detail(scale)
+        if self.window is not None:
+            object.update_norm_coord(self.window)
         self.obj_list.append(object)
 
+    def add_objects(
+            self,
+            objects: List[GraphicObject],
+            vertices: np.ndarray = None,
+            lengths: np.ndarray = None,
+    ):
+        # inserção em lote: um único bloco no VertexStore e uma só
+        # normalização; `vertices` e `lengths`, quando dados, são os
+        # vértices de todos os objetos enfileirados, na mesma ordem
+        if not objects:
+            return
+        if vertices is None:
+            blocks = [object.vertices for object in objects]
+            lengths = np.fromiter(map(len, blocks), dtype=np.int64, count=len(blocks))
+            vertices = np.concatenate(blocks)
+
+        slots = self.store.extend(vertices, lengths)
+        self._register(objects, slots)
+        if self.window is not None:
+            self._normalize(slots, *self.normalization())
+
+    def adopt(
+            self,
+            objects: List[GraphicObject],
+            vertices: np.ndarray,
+            offsets: np.ndarray,
+            lengths: np.ndarray,
+            bounds: np.ndarray = None,
+    ):
+        # display file inteiro a partir de arrays prontos, sem copiar os
+        # vértices; cada objeto é normalizado quando aparecer na window
+        slots = self.store.adopt(vertices, offsets, lengths, bounds)
+        self._register(objects, slots)
+
+    def _register(self, objects: List[GraphicObject], slots: np.ndarray):
+        for object, slot in zip(objects, slots.tolist()):
+            object._adopt(self.store, slot)
+        self._identify(objects)
+
+        curves = [
+            object for object in objects
+            if isinstance(object, Curve) and object.control_points is not None
+        ]
+        if curves:
+            self.curves.extend(curves)
+            self._curve_slots = np.append(
+                self._curve_slots, [curve._slot for curve in curves]
+            )
+        adaptive = [object for object in curves if object.adaptive]
+        if adaptive:
+            self.adaptive_curves.extend(adaptive)
+            scale = self.pixel_scale()
+            if scale is not None:
+                for curve in adaptive:
+                    curve.level_of_detail(scale)
+
+        self.obj_list.extend(objects)
+
+    def _identify(self, objects: List[GraphicObject]):
+        ids = range(self._next_id, self._next_id + len(objects))
+        for id, object in zip(ids, objects):
+            object.id = id
+        self.by_id.update(zip(ids, objects))
+        self._next_id += len(objects)
+
+    def snapshot(self, window: Window) -> 'View':
+        # a mesma cena vista por outra window: display file, índice e objetos
+        # são compartilhados, assim como os caches; a window e o viewport não
+        view = copy.copy(self)
+        view.window = window
+        return view
+
+    def pixel_scale(self) -> Optional[float]:
+        # pixels do viewport por unidade do mundo
+        if self.window is None or self.viewport is None:
+            return None
+        return max(
+            self.viewport.width / self.window.width,
+            self.viewport.height / self.window.height,
+        )
+
+    def set_viewport(self, viewport: Rectangle):
+        self.viewport = viewport
+
+    def update_level_of_detail(self):
+        scale = self.pixel_scale()
+        self._cache.lod_scale = scale
+        if scale is None:
+            return
+        for curve in self.adaptive_curves:
+            curve.level_of_detail(scale)
+
+    def normalization(self) -> Tuple[np.ndarray, int]:
+        # uma matriz por versão da window, composta uma vez só; matriz e
+        # versão saem juntas porque a window pode mudar em outra thread, e a
+        # versão vem antes: na pior das hipóteses ela é velha para a matriz
+        # e os objetos são normalizados de novo no próximo frame. A versão
+        # basta como chave: é única entre windows e mantida pelos snapshots
+        window, cache = self.window, self._cache
+        version = window.version
+        cached, matrix = cache.norm
+        if version != cached:
+            matrix = normalized_matrix(window)
+            if window.version == version:
+                # só guarda a matriz se a window não mudou enquanto era composta
+                cache.norm = (version, matrix)
+        return matrix, version
+
+    def _normalize(self, slots: np.ndarray, t_matrix: np.ndarray, version: int):
+        self.store.normalize(slots, t_matrix)
+        self.store.mark_normalized(slots, version)
+        for slot in np.intersect1d(slots, self._curve_slots):
+            self.obj_list[slot].normalize_control_points(t_matrix)
+
+    def refresh_level_of_detail(self):
+        if self.pixel_scale() != self._cache.lod_scale:
+            self.update_level_of_detail()
+
+    def refresh(self):
+        # transformações pendentes: mundo e NDC numa passada por objeto
+        t_matrix, version = self.normalization()
+        flushed = np.fromiter(self.store.dirty, dtype=np.int64, count=len(self.store.dirty))
+        for slot in flushed:
+            self.obj_list[slot]._flush(t_matrix)
+        self.store.mark_normalized(flushed, version)
+        for slot in np.intersect1d(flushed, self._curve_slots):
+            self.obj_list[slot].normalize_control_points(t_matrix)
+
     def update_norm_coord(self):
-        for obj in self.obj_list:
-            obj.update_ndc(self.window)
+        for slot in list(self.store.dirty):
+            self.obj_list[slot]._flush()
+        self.update_level_of_detail()
+        # uma única multiplicação para a cena inteira
+        t_matrix, version = self.normalization()
+        self.store.update_norm_coord(t_matrix)
+        self.store.mark_normalized(slice(0, self.store.count), version)
+        for curve in self.curves:
+            curve.normalize_control_points(t_matrix)
+
+    def candidates(self, bounds=None) -> np.ndarray:
+        # slots da grade que a window (ou a região dada) alcança,
+        # na ordem do display file
+        if bounds is None:
+            bounds = self.window.bounds()
+        slots = np.fromiter(self.index.query(bounds), dtype=np.int64)
+
+        pending = self.store.unindexed
+        if len(pending):
+            # adotados que ainda não estão na grade: teste direto das caixas
+            xmin, ymin, xmax, ymax = bounds
+            box = self.store.bounds[pending]
+            hit = pending[
+                (box[:, 0] <= xmax) & (box[:, 2] >= xmin)
+                & (box[:, 1] <= ymax) & (box[:, 3] >= ymin)
+            ]
+            return np.union1d(slots, hit)
+        slots.sort()
+        return slots
+
+    def index_pending(self, limit: int = 16384) -> bool:
+        return self.store.index_pending(limit)
+
+    def normalize_stale(self, slots: np.ndarray):
+        # só os candidatos desatualizados são normalizados de novo
+        t_matrix, version = self.normalization()
+        stale = self.store.stale(slots, version)
+        if len(stale):
+            self._normalize(stale, t_matrix, version)
+
+    def visible_objects(self) -> List[GraphicObject]:
+        self.refresh_level_of_detail()
+        self.refresh()
+        slots = self.candidates()
+        self.normalize_stale(slots)
+        return [self.obj_list[slot] for slot in slots]
+
+    def flush(self, slots: np.ndarray):
+        # aplica as transformações pendentes dos objetos dados
+        for slot in self.store.dirty.intersection(slots.tolist()):
+            self.obj_list[slot]._flush()
+
+    def centroids(self, objects: List[GraphicObject]) -> np.ndarray:
+        slots = self.slots(objects)
+        self.flush(slots)
+        return self.store.centroids(slots)
+
+    def transform_objects(
+            self,
+            objects: List[GraphicObject],
+            matrix: np.ndarray,
+            references: np.ndarray = None,
+    ):
+        # uma transformação para vários objetos: os vértices de todos num
+        # só produto, e a normalização refeita só para eles; `references`
+        # dá o ponto (x, y) de cada objeto em torno do qual ela é aplicada
+        if not objects:
+            return
+        slots = self.slots(objects)
+        self.flush(slots)
+        self.store.transform_many(slots, matrix, references)
+
+        for i, object in enumerate(objects):
+            if isinstance(object, Curve):
+                if references is None:
+                    object.transform_control_points(matrix)
+                else:
+                    x, y = references[i].tolist()
+                    object.transform_control_points(
+                        translate_matrix(-x, -y) @ matrix @ translate_matrix(x, y)
+                    )
+        if self.window is not None:
+            self._normalize(slots, *self.normalization())
+
+    def slots(self, objects: List[GraphicObject]) -> np.ndarray:
+        return np.fromiter((o._slot for o in objects), dtype=np.int64, count=len(objects))
+
+    def normalized_endpoints(self, lines: List['Line']):
+        offsets = self.store.offsets[self.slots(lines)]
+        return self.store.normalized[offsets], self.store.normalized[offsets + 1]
 
 class Point(GraphicObject):
     def __init__(self, posicao: Vetor2D, name=''):
         super().__init__(vertices=[posicao], name=name)
 
     @property
-    def posicao(self) -> float:
-        return self.vertices[0]
+    def posicao(self) -> Vetor2D:
+        return self._vertex(0)
 
     @posicao.setter
     def posicao(self, value: Vetor2D):
-        self.vertices[0] = value
-
-    def draw(self, cr: cairo.Context, vp_matrix: np.ndarray):
-        posicao_vp = self.normalized_vertices[0] @ vp_matrix
-        cr.move_to(posicao_vp.x, posicao_vp.y)
-        cr.arc(posicao_vp.x, posicao_vp.y, 1, 0, 2 * np.pi)
+        self._set_vertex(0, value)
+
+    def draw(self, cr: cairo.Context, vp_matrix: np.ndarray, vertices: np.ndarray = None):
+        if vertices is None:
+            vertices = self.normalized_vertices
+        x, y, _ = vertices[0] @ vp_matrix
+        cr.move_to(x, y)
+        cr.arc(x, y, 1, 0, 2 * np.pi)
         cr.fill()
 
-    def clipped(self, *args, **kwargs) -> Optional['Point']:
-        posicao = self.normalized_vertices[0]
+    def clipped(self, *args, **kwargs) -> Optional[ClippedGeometry]:
+        x, y, _ = self.normalized_vertices[0].tolist()
 
         return (
-            self if (posicao.x >= -1
-                     and posicao.x <= 1
-                     and posicao.y >= -1
-                     and posicao.y <= 1
+            ClippedGeometry(self, self.normalized_vertices) if (x >= -1
+                     and x <= 1
+                     and y >= -1
+                     and y <= 1
                      )
             else None
         )
@@ -188,28 +651,30 @@ class Line(GraphicObject):
         super().__init__(vertices=[inicio, fim], name=name)
 
     @property
-    def inicio(self):
-        return self.vertices[0]
+    def inicio(self) -> Vetor2D:
+        return self._vertex(0)
 
     @inicio.setter
     def inicio(self, value: Vetor2D):
-        self.vertices[0] = value
+        self._set_vertex(0, value)
 
     @property
-    def fim(self):
-        return self.vertices[1]
+    def fim(self) -> Vetor2D:
+        return self._vertex(1)
 
     @fim.setter
     def fim(self, value: Vetor2D):
-        self.vertices[1] = value
-
-    def draw(self, cr: cairo.Context,vp_matrix: np.ndarray):
-        inicio_vp, fim_vp = [v @ vp_matrix for v in self.normalized_vertices]
-        cr.move_to(inicio_vp.x, inicio_vp.y)
-        cr.line_to(fim_vp.x, fim_vp.y)
+        self._set_vertex(1, value)
+
+    def draw(self, cr: cairo.Context,vp_matrix: np.ndarray, vertices: np.ndarray = None):
+        if vertices is None:
+            vertices = self.normalized_vertices
+        inicio_vp, fim_vp = vertices @ vp_matrix
+        cr.move_to(inicio_vp[0], inicio_vp[1])
+        cr.line_to(fim_vp[0], fim_vp[1])
         cr.stroke()
 
-    def clipped(self, method: 'LineClippingMethod') -> Optional[GraphicObject]:
+    def clipped(self, method: 'LineClippingMethod') -> Optional[ClippedGeometry]:
         from clipping import line_clip
         return line_clip(self, method)
 
@@ -218,89 +683,130 @@ class Polygon(GraphicObject):
     def __init__(self, vertices, name='', filled=False):
         super().__init__(vertices=vertices, name=name)
         self.filled = filled
-    def draw(self, cr: cairo.Context,vp_matrix: np.ndarray):
+    def draw(self, cr: cairo.Context,vp_matrix: np.ndarray, vertices: np.ndarray = None):
+        if vertices is None:
+            vertices = self.normalized_vertices
 
-        for i in range(len(self.normalized_vertices)):
-            proximo_vp = self.normalized_vertices[i] @ vp_matrix
-            cr.line_to(proximo_vp.x, proximo_vp.y)
+        for x, y, _ in vertices @ vp_matrix:
+            cr.line_to(x, y)
         cr.close_path()
         if self.filled:
             cr.stroke_preserve()
             cr.fill()
         else:
             cr.stroke()
-    def clipped(self, *args, **kwargs) -> Optional['Polygon']:
+    def clipped(self, *args, **kwargs) -> Optional[ClippedGeometry]:
         from clipping import poly_clipping
 
         return poly_clipping(self)
 
 class Curve(GraphicObject):
-    def __init__(self, vertices, name=''):
+    # quantos níveis de zoom cada curva adaptativa mantém tesselados
+    LOD_CACHE_SIZE = 8
+
+    def __init__(
+            self,
+            vertices,
+            name='',
+            control_points=None,
+            type='bezier',
+            adaptive=False,
+            tolerance=0.5,
+            segment_offsets=None,
+    ):
         super().__init__(vertices=vertices, name=name)
+        self.control_points = (
+            None if control_points is None
+            else vertex_array(control_points).copy()
+        )
+        self.normalized_control_points = self.control_points
+        # onde começa cada segmento nos vértices tesselados
+        self.segment_offsets = segment_offsets
+        self.type = type
+        # tolerância de planicidade em pixels do viewport
+        self.adaptive = adaptive and self.control_points is not None
+        self.tolerance = tolerance
+        self._level: Optional[int] = None
+        self._lod_cache: 'OrderedDict[int, np.ndarray]' = OrderedDict()
 
     @classmethod
-    def control_point(cls, control_points, type="bezier", name = '', n_points=20):
-        proj_x = np.array([v.x for v in control_points], dtype=float)
-        proj_y = np.array([v.y for v in control_points], dtype=float)
-        vertices = []
-
-        if type == "bezier":
-            for i in range(0, len(control_points) -1, 3):
-                for t in np.linspace(0, 1, n_points):
-                    # matriz linha dos parâmetros
-                    T = np.array([t**3, t**2, t, 1], dtype=float)
-                    M = T @ cls.bezier_matrix()
-                    # Blending Functions
-                    x = M @ proj_x[i:i+4]
-                    y = M @ proj_y[i:i+4]
-                    vertices.append(Vetor2D(x, y))
-        elif type == "bspline":
-            for i in range(0, len(control_points) -3):
-                # Vetor de Geometria B-Spline
-                Gbs_x = proj_x[i:i+4]
-                Gbs_y = proj_y[i:i+4]
-                # Coeficientes
-                Cx = cls.bspline_matrix() @ Gbs_x
-                Cy = cls.bspline_matrix() @ Gbs_y
-                # Condições iniciais
-                Dx = cls.fd_matrix(1.0 / n_points) @ Cx
-                Dy = cls.fd_matrix(1.0 / n_points) @ Cy
-
-                for k in range(n_points+1):
-                    x = Dx[0]
-                    y = Dy[0]
-
-                    Dx = Dx + np.append(Dx[1:], 0)
-                    Dy = Dy + np.append(Dy[1:], 0)
-
-                    vertices.append(Vetor2D(x, y))
-        return cls(vertices, name=name)
+    def control_point(
+            cls,
+            control_points,
+            type="bezier",
+            name = '',
+            n_points=20,
+            adaptive=False,
+            tolerance=0.5,
+    ):
+        return cls(
+            tessellate(control_points, type, n_points),
+            name=name,
+            control_points=control_points,
+            type=type,
+            adaptive=adaptive,
+            tolerance=tolerance,
+            segment_offsets=segment_offsets(control_points, type, n_points),
+        )
+
+    def transform(self, matrix: np.ndarray):
+        super().transform(matrix)
+        self.transform_control_points(matrix)
+
+    def transform_control_points(self, matrix: np.ndarray):
+        if self.control_points is not None:
+            self.control_points = self.control_points @ matrix
+        self._level = None
+        self._lod_cache.clear()
+
+    def update_norm_coord(self, window: 'Window'):
+        super().update_norm_coord(window)
+        self.normalize_control_points(normalized_matrix(window))
+
+    def normalize_control_points(self, t_matrix: np.ndarray):
+        if self.control_points is not None:
+            self.normalized_control_points = self.control_points @ t_matrix
+
+    def segment_hulls(self) -> Optional[np.ndarray]:
+        # bounding box em NDC dos pontos de controle de cada segmento
+        if self.segment_offsets is None:
+            return None
+        return segment_hulls(self.normalized_control_points, self.type)
+
+    def level_of_detail(self, scale: float) -> bool:
+        # níveis de zoom em quartos de oitava; cada nível é tesselado
+        # para a maior escala do intervalo
+        level = ceil(4 * log2(scale))
+        if level == self._level:
+            return False
+
+        tessellated = self._lod_cache.get(level)
+        if tessellated is None:
+            tessellated = adaptive_tessellate(
+                self.control_points,
+                self.type,
+                2 ** (level / 4),
+                self.tolerance,
+            )
+            self._lod_cache[level] = tessellated
+            if len(self._lod_cache) > self.LOD_CACHE_SIZE:
+                self._lod_cache.popitem(last=False)
+        else:
+            self._lod_cache.move_to_end(level)
+
+        self._level = level
+        self.vertices, self.segment_offsets = tessellated
+        return True
 
     @classmethod
     # produto da matriz de Hermite pela
     # matriz de compatibilidade de Hermite para Bezier
     def bezier_matrix(cls):
-        return np.array(
-            [
-                -1, 3, -3, 1,
-                3, -6, 3, 0,
-                -3, 3, 0, 0,
-                1, 0, 0, 0
-            ],
-            dtype=float
-        ).reshape(4, 4)
+        return BEZIER_MATRIX.copy()
 
     @classmethod
     def bspline_matrix(cls):
-        return np.array(
-            [
-                -1, 3, -3, 1,
-                3, -6, 3, 0,
-                -3, 0, 3, 0,
-                1, 4, 1, 0
-            ],
-            dtype=float
-        ).reshape(4, 4) / 6
+        return BSPLINE_MATRIX.copy()
 
     @classmethod
     # Forward Difference
@@ -315,13 +821,19 @@ class Curve(GraphicObject):
             dtype=float
         ).reshape(4, 4)
 
-    def draw(self, cr: cairo.Context, vp_matrix: np.ndarray):
-        for i in range(len(self.normalized_vertices)):
-            proximo_vp = self.normalized_vertices[i] @ vp_matrix
-            cr.line_to(proximo_vp.x, proximo_vp.y)
+    def draw(self, cr: cairo.Context, vp_matrix: np.ndarray, vertices: np.ndarray = None):
+        if vertices is None:
+            vertices = self.normalized_vertices
+
+        for x, y, _ in vertices @ vp_matrix:
+            # trechos separados por NaN depois do clipping
+            if np.isnan(x):
+                cr.new_sub_path()
+            else:
+                cr.line_to(x, y)
         cr.stroke()
 
-    def clipped(self, *args, **kwargs):
+    def clipped(self, *args, **kwargs) -> Optional[ClippedGeometry]:
         from clipping import curve_clipping
 
         return curve_clipping(self)
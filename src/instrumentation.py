@@ -0,0 +1,119 @@
+import json
+import sys
+import time
+
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import cairo
+import numpy as np
+
+
+# Tempos por etapa e contadores de cada frame, com percentis móveis
+# dos últimos `history` frames e um log opcional em JSON lines
+class FrameStats:
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, history: int = 120, log_path: Optional[str] = None):
+        self.history = history
+        self.overlay = False
+        self.frames = 0
+        self.timings: Dict[str, deque] = defaultdict(lambda: deque(maxlen=self.history))
+        self.counts: Dict[str, int] = {}
+        self._current: Dict[str, float] = defaultdict(float)
+        self._start = None
+        self._log = open(log_path, 'a', buffering=1) if log_path else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.overlay or self._log is not None
+
+    def begin_frame(self):
+        self._current = defaultdict(float)
+        self.counts = {}
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._current[name] += time.perf_counter() - start
+
+    def count(self, name: str, value: int):
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def end_frame(self):
+        self._current['frame'] = time.perf_counter() - self._start
+        for name, seconds in self._current.items():
+            self.timings[name].append(seconds)
+        self.frames += 1
+
+        if self._log is not None:
+            self._log.write(json.dumps({
+                'frame': self.frames,
+                'time': time.time(),
+                'stages_ms': {k: v * 1000 for k, v in self._current.items()},
+                'counts': self.counts,
+            }) + '\n')
+
+    def percentiles(self, name: str) -> Dict[int, float]:
+        values = np.fromiter(self.timings[name], dtype=float)
+        if not len(values):
+            return {}
+        return dict(zip(self.PERCENTILES, np.percentile(values, self.PERCENTILES)))
+
+    def summary(self) -> Dict[str, Dict[int, float]]:
+        return {name: self.percentiles(name) for name in list(self.timings)}
+
+    def draw_overlay(self, cr: cairo.Context, x: float = 16, y: float = 16):
+        lines = [f"{'etapa':<28}{'p50':>8}{'p95':>8}{'p99':>8}  ms"]
+        for name, values in sorted(self.summary().items()):
+            lines.append(name.ljust(28) + ''.join(
+                f'{values[p] * 1000:8.2f}' for p in self.PERCENTILES
+            ))
+        lines.append('  '.join(f'{k}: {v}' for k, v in sorted(self.counts.items())))
+
+        cr.save()
+        cr.select_font_face('monospace', cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
+        cr.set_font_size(11)
+        height = 14 * len(lines) + 8
+        cr.set_source_rgba(0, 0, 0, 0.7)
+        cr.rectangle(x, y, 420, height)
+        cr.fill()
+        cr.set_source_rgb(1, 1, 1)
+        for i, line in enumerate(lines):
+            cr.move_to(x + 6, y + 16 + 14 * i)
+            cr.show_text(line)
+        cr.restore()
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+# Tempo de cada fase da abertura do programa, desde `start`; impresso
+# uma vez só, quando a última fase termina
+class StartupReport:
+    def __init__(self, start: float, enabled: bool = True):
+        self.enabled = enabled
+        self.phases: Dict[str, float] = {}
+        self._start = start
+        self._last = start
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self.phases[phase] = now - self._last
+        self._last = now
+
+    def report(self, file=None):
+        if not self.enabled:
+            return
+        self.enabled = False
+        file = file or sys.stderr
+        for phase, seconds in self.phases.items():
+            print(f'{phase:<28}{seconds * 1000:10.1f} ms', file=file)
+        print(f'{"total":<28}{(self._last - self._start) * 1000:10.1f} ms', file=file)
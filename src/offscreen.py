@@ -0,0 +1,48 @@
+import cairo
+import numpy as np
+
+from typing import Optional, Tuple
+
+from clipping import LineClippingMethod
+from drawable import View, Window
+from render import default_window, paint_frame, viewport_rect
+
+
+# Renderização sem GTK: o mesmo frame do onDraw, numa ImageSurface
+def render(
+        view: View,
+        window: Optional[Window] = None,
+        size: Tuple[int, int] = (800, 600),
+        method=LineClippingMethod.COHEN_SUTHERLAND,
+) -> cairo.ImageSurface:
+    width, height = size
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+    cr = cairo.Context(surface)
+
+    # numa cópia da view: a window e o viewport da original ficam como estão
+    window = window or view.window or default_window(width, height)
+    paint_frame(cr, view.snapshot(window), viewport_rect(width, height), method)
+
+    surface.flush()
+    return surface
+
+
+def write_png(surface: cairo.ImageSurface, path: str):
+    surface.write_to_png(path)
+
+
+def to_array(surface: cairo.ImageSurface) -> np.ndarray:
+    # pixels (altura, largura, 4) em BGRA premultiplicado, sem cópia
+    surface.flush()
+    data = np.ndarray(
+        shape=(surface.get_height(), surface.get_stride()),
+        dtype=np.uint8,
+        buffer=surface.get_data(),
+    )
+    return data[:, :surface.get_width() * 4].reshape(
+        surface.get_height(), surface.get_width(), 4
+    )
+
+
+def to_bytes(surface: cairo.ImageSurface) -> bytes:
+    return to_array(surface).tobytes()
@@ -0,0 +1,283 @@
+import multiprocessing
+import os
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+from clipping import (
+    LineClippingMethod,
+    clip_curve_vertices,
+    clip_polygon_vertices,
+    line_clip_batch,
+)
+from displayfile import ranges
+from drawable import ClippedGeometry, Curve, Line, Point, Polygon, View
+from tessellation import segment_hulls, segment_offsets, tessellate
+
+# Clipping e tesselação repartidos entre processos. Os vértices vão para
+# os workers por memória compartilhada; cada worker devolve um único array
+# com o resultado do seu pedaço, e os pedaços são juntados na ordem em
+# que foram cortados, então o resultado é sempre o mesmo do serial.
+
+POINT, LINE, POLYGON, CURVE, POLYLINE = range(5)
+
+CURVE_TYPES = ('bezier', 'bspline')
+
+
+class SharedBuffer:
+    # array (N, 3) de float64 em memória compartilhada, recriado
+    # (com outro nome) quando precisa crescer
+    def __init__(self):
+        self.memory: Optional[shared_memory.SharedMemory] = None
+        self.array: Optional[np.ndarray] = None
+
+    def reserve(self, rows: int) -> np.ndarray:
+        if self.array is None or len(self.array) < rows:
+            self.close()
+            capacity = max(rows, 1024, 2 * (len(self.array) if self.array is not None else 0))
+            self.memory = shared_memory.SharedMemory(create=True, size=capacity * 24)
+            self.array = np.ndarray((capacity, 3), dtype=float, buffer=self.memory.buf)
+        return self.array
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+    def close(self):
+        if self.memory is not None:
+            self.array = None
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+
+
+# no worker: o último bloco compartilhado visto, pelo nome
+_attached: Dict[str, shared_memory.SharedMemory] = {}
+
+
+def _shared(name: str, rows: int) -> np.ndarray:
+    if name not in _attached:
+        for memory in _attached.values():
+            memory.close()
+        _attached.clear()
+        _attached[name] = shared_memory.SharedMemory(name=name)
+    return np.ndarray((rows, 3), dtype=float, buffer=_attached[name].buf)
+
+
+def _pack(results: List[Tuple[int, np.ndarray]]):
+    # (objeto, vértices) de um pedaço viram índices, tamanhos e um array só
+    results.sort(key=lambda item: item[0])
+    keep = np.array([index for index, _ in results], dtype=np.int64)
+    lengths = np.array([len(vertices) for _, vertices in results], dtype=np.int64)
+    vertices = np.concatenate([v for _, v in results]) if results else np.empty((0, 3))
+    return keep, lengths, vertices
+
+
+def _clip_chunk(task):
+    (
+        name, rows, method,
+        kinds, offsets, lengths, bounds,
+        control_offsets, control_lengths, types, curve_offsets,
+    ) = task
+    data = _shared(name, rows)
+    results = []
+
+    points = np.flatnonzero(kinds == POINT)
+    if len(points):
+        position = data[offsets[points], :2]
+        inside = np.all((position >= -1) & (position <= 1), axis=1)
+        results.extend((i, data[offsets[i]:offsets[i] + 1]) for i in points[inside].tolist())
+
+    lines = np.flatnonzero(kinds == LINE)
+    if len(lines):
+        inicio, fim, index = line_clip_batch(
+            data[offsets[lines]], data[offsets[lines] + 1],
+            method=LineClippingMethod[method],
+        )
+        segments = np.stack([inicio, fim], axis=1)
+        results.extend(zip(lines[index].tolist(), segments))
+
+    for i in np.flatnonzero(kinds == POLYGON).tolist():
+        vertices = data[offsets[i]:offsets[i] + lengths[i]]
+        clipped = clip_polygon_vertices(vertices, bounds[i])
+        if clipped is not None:
+            results.append((i, clipped))
+
+    for i in np.flatnonzero((kinds == CURVE) | (kinds == POLYLINE)).tolist():
+        vertices = data[offsets[i]:offsets[i] + lengths[i]]
+        hulls = None
+        if kinds[i] == CURVE:
+            start = control_offsets[i]
+            control_points = data[start:start + control_lengths[i]]
+            hulls = segment_hulls(control_points, CURVE_TYPES[types[i]])
+        clipped = clip_curve_vertices(vertices, hulls, curve_offsets.get(i))
+        if clipped is not None:
+            results.append((i, clipped))
+
+    return _pack(results)
+
+
+def _tessellate_chunk(task):
+    name, rows, offsets, lengths, types, n_points = task
+    data = _shared(name, rows)
+    results = [
+        (i, tessellate(data[offsets[i]:offsets[i] + lengths[i]], CURVE_TYPES[types[i]], n_points))
+        for i in range(len(offsets))
+    ]
+    return _pack(results)
+
+
+def _kind(object) -> Optional[int]:
+    if isinstance(object, Point):
+        return POINT
+    if isinstance(object, Line):
+        return LINE
+    if isinstance(object, Polygon):
+        return POLYGON
+    if isinstance(object, Curve):
+        return CURVE if object.segment_offsets is not None else POLYLINE
+    return None
+
+
+def _split(weights: np.ndarray, parts: int) -> List[Tuple[int, int]]:
+    # pedaços contíguos com mais ou menos o mesmo peso (número de vértices)
+    total = np.cumsum(weights)
+    if not len(total):
+        return []
+    cuts = np.searchsorted(total, total[-1] * np.arange(1, parts) / parts, side='right')
+    bounds = np.unique(np.concatenate([[0], cuts, [len(weights)]]))
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+
+class ParallelExecutor:
+    # abaixo de `threshold` vértices o trabalho fica no processo principal
+    def __init__(self, workers: int = None, threshold: int = 50_000, chunks_per_worker: int = 4):
+        self.workers = workers or os.cpu_count() or 1
+        self.threshold = threshold
+        self.chunks = self.workers * chunks_per_worker
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._buffer = SharedBuffer()
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: a interface tem threads, e fork com threads não é seguro
+            self._pool = ProcessPoolExecutor(
+                self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        self._buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def clip(
+            self,
+            view: View,
+            slots: np.ndarray,
+            method=LineClippingMethod.COHEN_SUTHERLAND,
+    ) -> Optional[Tuple[List[ClippedGeometry], np.ndarray]]:
+        # None quando não vale a pena repartir
+        store = view.store
+        lengths = store.lengths[slots]
+        if lengths.sum() < self.threshold:
+            return None
+
+        objects = [view.obj_list[slot] for slot in slots.tolist()]
+        kinds = [_kind(object) for object in objects]
+        if None in kinds:
+            return None
+        kinds = np.array(kinds, dtype=np.int8)
+
+        # vértices normalizados dos candidatos, e depois deles os pontos
+        # de controle normalizados das curvas
+        curves = np.flatnonzero(kinds == CURVE)
+        controls = [objects[i].normalized_control_points for i in curves.tolist()]
+        control_lengths = np.zeros(len(objects), dtype=np.int64)
+        control_lengths[curves] = [len(points) for points in controls]
+        n_vertices = int(lengths.sum())
+        rows = n_vertices + int(control_lengths.sum())
+
+        data = self._buffer.reserve(rows)
+        np.take(store.normalized, ranges(store.offsets[slots], lengths), axis=0, out=data[:n_vertices])
+        if controls:
+            data[n_vertices:rows] = np.concatenate(controls)
+        offsets = np.cumsum(lengths) - lengths
+        control_offsets = n_vertices + np.cumsum(control_lengths) - control_lengths
+        types = np.zeros(len(objects), dtype=np.int8)
+        types[curves] = [CURVE_TYPES.index(objects[i].type) for i in curves.tolist()]
+        bounds = store.ndc_bounds[slots]
+
+        tasks = []
+        chunks = _split(lengths + control_lengths, self.chunks)
+        for start, end in chunks:
+            curve_offsets = {
+                i - start: np.asarray(objects[i].segment_offsets)
+                for i in curves[(curves >= start) & (curves < end)].tolist()
+            }
+            tasks.append((
+                self._buffer.name, len(data), method.name,
+                kinds[start:end], offsets[start:end], lengths[start:end], bounds[start:end],
+                control_offsets[start:end], control_lengths[start:end], types[start:end],
+                curve_offsets,
+            ))
+
+        clipped = []
+        segments = []
+        for (start, _), (keep, out_lengths, vertices) in zip(chunks, self.pool.map(_clip_chunk, tasks)):
+            parts = np.split(vertices, np.cumsum(out_lengths)[:-1]) if len(keep) else []
+            for i, part in zip((keep + start).tolist(), parts):
+                if kinds[i] == LINE:
+                    segments.append(part)
+                else:
+                    clipped.append(ClippedGeometry(objects[i], part))
+
+        # mesma ordem do clipping serial: um tipo de objeto por vez
+        order = {}
+        for object in objects:
+            order.setdefault(type(object), len(order))
+        clipped.sort(key=lambda item: order[type(item.source)])
+        segments = np.concatenate(segments) if segments else np.empty((0, 3))
+        return clipped, segments
+
+    def tessellate(
+            self,
+            control_points: List[np.ndarray],
+            types: List[str],
+            n_points: int = 20,
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        # (vértices, offsets dos segmentos) de cada curva, na ordem dada
+        if not control_points:
+            return []
+        lengths = np.fromiter(map(len, control_points), dtype=np.int64, count=len(control_points))
+        codes = np.array([CURVE_TYPES.index(type) for type in types], dtype=np.int8)
+
+        if lengths.sum() * n_points < self.threshold:
+            results = [tessellate(points, type, n_points) for points, type in zip(control_points, types)]
+        else:
+            data = self._buffer.reserve(int(lengths.sum()))
+            data[:lengths.sum()] = np.concatenate(control_points)
+            offsets = np.cumsum(lengths) - lengths
+            tasks = [
+                (self._buffer.name, len(data), offsets[start:end], lengths[start:end], codes[start:end], n_points)
+                for start, end in _split(lengths, self.chunks)
+            ]
+            results = []
+            for _, out_lengths, vertices in self.pool.map(_tessellate_chunk, tasks):
+                results.extend(np.split(vertices, np.cumsum(out_lengths)[:-1]))
+
+        return [
+            (vertices, segment_offsets(points, type, n_points))
+            for vertices, points, type in zip(results, control_points, types)
+        ]
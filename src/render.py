@@ -0,0 +1,245 @@
+import cairo
+import numpy as np
+
+from collections import defaultdict
+from contextlib import nullcontext
+from math import pi
+from typing import Callable, List, Optional
+
+from clipping import LineClippingMethod, line_clip_batch
+from drawable import ClippedGeometry, Line, Point, Polygon, Rectangle, Vetor2D, View, Window
+from instrumentation import FrameStats
+from transformations import viewport_matrix
+
+
+# espaço entre a borda da área de desenho e o viewport
+MARGIN = 10
+
+# grupos de estilo: cada um vira um único path do cairo
+POINTS = 'points'
+STROKES = 'strokes'
+FILLED = 'filled'
+
+
+class FrameCancelled(Exception):
+    # o frame em andamento ficou velho e foi abandonado no meio
+    pass
+
+
+def check_cancelled(cancelled: Optional[Callable[[], bool]]):
+    if cancelled is not None and cancelled():
+        raise FrameCancelled()
+
+
+def viewport_rect(width: float, height: float, margin: float = MARGIN) -> Rectangle:
+    return Rectangle(
+        min=Vetor2D(0, 0),
+        max=Vetor2D(width, height),
+    ).with_margin(margin)
+
+
+def default_window(width: float, height: float) -> Window:
+    # window do tamanho da área de desenho, centrada na origem
+    return Window(
+        Vetor2D(-width / 2, -height / 2),
+        Vetor2D(width / 2, height / 2),
+    )
+
+
+def style(clipped: ClippedGeometry) -> str:
+    source = clipped.source
+    if isinstance(source, Point):
+        return POINTS
+    if isinstance(source, Polygon) and source.filled:
+        return FILLED
+    return STROKES
+
+
+def clip_frame(
+        view: View,
+        method=LineClippingMethod.COHEN_SUTHERLAND,
+        stats: Optional[FrameStats] = None,
+        bounds=None,
+        executor: Optional['ParallelExecutor'] = None,
+        cancelled: Optional[Callable[[], bool]] = None,
+):
+    # `cancelled` é consultado entre as etapas; se ele disser que o frame
+    # não é mais necessário, FrameCancelled interrompe o desenho
+    stage = stats.stage if stats is not None else nullcontext
+
+    with stage('tessellation'):
+        view.refresh_level_of_detail()
+    check_cancelled(cancelled)
+    with stage('normalization'):
+        view.refresh()
+        slots = view.candidates(bounds)
+        view.normalize_stale(slots)
+    check_cancelled(cancelled)
+
+    result = None
+    if executor is not None:
+        with stage('clipping.parallel'):
+            result = executor.clip(view, slots, method)
+    if result is None:
+        result = _clip_serial(view, slots, method, stage)
+    clipped, segments = result
+    check_cancelled(cancelled)
+
+    if stats is not None:
+        drawn = len(clipped) + len(segments) // 2
+        stats.count('objects', len(view.obj_list))
+        stats.count('culled', len(view.obj_list) - len(slots))
+        stats.count('clipped', len(slots) - drawn)
+        stats.count('drawn', drawn)
+    return clipped, segments
+
+
+def _clip_serial(view: View, slots: np.ndarray, method, stage):
+    # recorta tudo o que é visível, um tipo de objeto por vez;
+    # as retas vão num lote só
+    by_type = defaultdict(list)
+    for slot in slots:
+        object = view.obj_list[slot]
+        by_type[type(object)].append(object)
+
+    clipped: List[ClippedGeometry] = []
+    lines = by_type.pop(Line, [])
+    for cls, objects in by_type.items():
+        with stage(f'clipping.{cls.__name__.lower()}'):
+            for object in objects:
+                result = object.clipped(method=method)
+                if result is not None:
+                    clipped.append(result)
+
+    segments = np.empty((0, 3))
+    if lines:
+        with stage(f'clipping.line.{method.name.lower()}'):
+            inicio, fim, _ = line_clip_batch(*view.normalized_endpoints(lines), method=method)
+            segments = np.stack([inicio, fim], axis=1).reshape(-1, 3)
+    return clipped, segments
+
+
+def _emit_polyline(cr: cairo.Context, points: list, closed: bool = False):
+    cr.new_sub_path()
+    for x, y in points:
+        # trechos separados por NaN depois do clipping
+        if x != x:
+            cr.new_sub_path()
+        else:
+            cr.line_to(x, y)
+    if closed:
+        cr.close_path()
+
+
+def _signed_area(points: np.ndarray) -> float:
+    x, y = points[:, 0], points[:, 1]
+    return float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+
+
+def draw_batched(
+        cr: cairo.Context,
+        vp_matrix: np.ndarray,
+        clipped: List[ClippedGeometry],
+        segments: np.ndarray = None,
+):
+    groups = {POINTS: [], STROKES: [], FILLED: []}
+    for item in clipped:
+        groups[style(item)].append(item)
+    order = groups[POINTS] + groups[STROKES] + groups[FILLED]
+
+    # tudo para o viewport num só produto
+    arrays = [np.asarray(item.normalized_vertices)[:, :3] for item in order]
+    if segments is not None and len(segments):
+        arrays.append(segments)
+    if not arrays:
+        return
+    lengths = [len(a) for a in arrays]
+    screen = np.concatenate(arrays) @ vp_matrix
+    parts = np.split(screen[:, :2], np.cumsum(lengths)[:-1])
+
+    n_points = len(groups[POINTS])
+    n_strokes = len(groups[STROKES])
+    points = parts[:n_points]
+    strokes = parts[n_points:n_points + n_strokes]
+    filled = parts[n_points + n_strokes:len(order)]
+
+    if points:
+        for x, y in np.concatenate(points).tolist():
+            cr.new_sub_path()
+            cr.arc(x, y, 1, 0, 2 * pi)
+        cr.fill()
+
+    if strokes or len(arrays) > len(order):
+        for item, part in zip(groups[STROKES], strokes):
+            _emit_polyline(cr, part.tolist(), closed=isinstance(item.source, Polygon))
+        if len(arrays) > len(order):
+            for x0, y0, x1, y1 in parts[-1].reshape(-1, 4).tolist():
+                cr.move_to(x0, y0)
+                cr.line_to(x1, y1)
+        cr.stroke()
+
+    if filled:
+        for part in filled:
+            # mesma orientação em todos, para que a regra de preenchimento
+            # não abra buracos onde dois polígonos se sobrepõem
+            if _signed_area(part) < 0:
+                part = part[::-1]
+            _emit_polyline(cr, part.tolist(), closed=True)
+        cr.stroke_preserve()
+        cr.fill()
+
+
+def draw_frame(
+        cr: cairo.Context,
+        view: View,
+        vp_matrix: np.ndarray,
+        method=LineClippingMethod.COHEN_SUTHERLAND,
+        stats: Optional[FrameStats] = None,
+        bounds=None,
+        executor: Optional['ParallelExecutor'] = None,
+        cancelled: Optional[Callable[[], bool]] = None,
+):
+    clipped, segments = clip_frame(view, method, stats, bounds, executor, cancelled)
+    with stats.stage('drawing') if stats is not None else nullcontext():
+        draw_batched(cr, vp_matrix, clipped, segments)
+
+
+def paint_scene(
+        cr: cairo.Context,
+        view: View,
+        vp_matrix: np.ndarray,
+        method=LineClippingMethod.COHEN_SUTHERLAND,
+        stats: Optional[FrameStats] = None,
+        bounds=None,
+        executor: Optional['ParallelExecutor'] = None,
+        cancelled: Optional[Callable[[], bool]] = None,
+):
+    # fundo e objetos, sem a borda do viewport
+    cr.set_line_width(1.0)
+    cr.set_source_rgb(0, 0, 0)
+    cr.paint()
+    cr.set_source_rgb(0, 0, 100)
+    draw_frame(cr, view, vp_matrix, method, stats, bounds, executor, cancelled)
+
+
+def paint_frame(
+        cr: cairo.Context,
+        view: View,
+        viewport: Rectangle,
+        method=LineClippingMethod.COHEN_SUTHERLAND,
+        stats: Optional[FrameStats] = None,
+        executor: Optional['ParallelExecutor'] = None,
+):
+    # o frame completo, igual na tela e fora dela
+    if stats is not None:
+        stats.begin_frame()
+    vp_matrix = viewport_matrix(viewport)
+    view.set_viewport(viewport)
+
+    paint_scene(cr, view, vp_matrix, method, stats, executor=executor)
+    viewport.draw(cr, vp_matrix)
+
+    if stats is not None:
+        stats.end_frame()
+        if stats.overlay:
+            stats.draw_overlay(cr)
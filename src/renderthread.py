@@ -0,0 +1,207 @@
+import threading
+import traceback
+import cairo
+
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Tuple
+
+from backing import BackingStore
+from clipping import LineClippingMethod
+from drawable import Rectangle, View
+from instrumentation import FrameStats
+from render import FrameCancelled
+from transformations import viewport_matrix
+
+
+# Frames desenhados fora do loop da interface. Cada pedido leva uma cópia
+# da window; a thread desenha o pedido mais recente no buffer de trás e
+# troca com o da frente, que é o único que o onDraw lê. Um pedido novo
+# cancela os anteriores: os que ainda não começaram são pulados, e um
+# frame em andamento para na próxima etapa (normalização, clipping, desenho).
+#
+# A cena (display file, índice, objetos) só muda com `lock`, que a thread
+# segura durante o frame. A interface não espera por ele: as mudanças vão
+# por `mutate`, que as aplica na hora ou as deixa na fila para a thread
+# aplicar antes do próximo frame, e `hold` cancela o frame em andamento
+# antes de pegar o lock.
+class RenderThread:
+    def __init__(
+            self,
+            view: View,
+            on_frame: Callable[[], None],
+            backing: Optional[BackingStore] = None,
+    ):
+        self.view = view
+        # chamado da thread de desenho a cada frame pronto
+        self.on_frame = on_frame
+        self.backing = backing or BackingStore()
+        self.lock = threading.RLock()
+        self.generation = 0
+        self.front: Optional[cairo.ImageSurface] = None
+        self._back: Optional[cairo.ImageSurface] = None
+        self._front_lock = threading.Lock()
+        self._condition = threading.Condition()
+        self._request = None
+        # mudanças na cena esperando o fim do frame em andamento
+        self._changes: List[Callable[[], None]] = []
+        self._key = None
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='render', daemon=True)
+        self._thread.start()
+
+    def _state(self, viewport: Rectangle, size: Tuple[int, int], method, version: int):
+        return (
+            self.view.window.version, tuple(viewport.vertices[:, :2].ravel()),
+            tuple(size), method, version,
+        )
+
+    def request(
+            self,
+            viewport: Rectangle,
+            size: Tuple[int, int],
+            method=LineClippingMethod.COHEN_SUTHERLAND,
+            stats: Optional[FrameStats] = None,
+    ) -> bool:
+        # pede um frame para o estado atual; False se ele já foi pedido
+        key = self._state(viewport, size, method, self.view.store.version)
+        with self._condition:
+            if key == self._key:
+                return False
+            self._key = key
+            self.generation += 1
+            self._request = (self.generation, key, self.view.window.snapshot(), viewport, size, method, stats)
+            self._condition.notify()
+        return True
+
+    def mutate(self, change: Callable[[], None]):
+        # `change` altera a cena: já, se nenhum frame está sendo desenhado;
+        # senão na thread de desenho, logo depois que o frame em andamento,
+        # que já estaria velho, for cancelado
+        if self.lock.acquire(blocking=False):
+            try:
+                change()
+            finally:
+                self.lock.release()
+            return
+        with self._condition:
+            self._changes.append(change)
+            self._cancel()
+            self._condition.notify()
+
+    @contextmanager
+    def hold(self):
+        # a cena só para quem a segura, sem esperar o frame em andamento
+        # terminar; o frame cancelado é pedido de novo depois
+        with self._condition:
+            self._cancel()
+        with self.lock:
+            yield
+        self.on_frame()
+
+    def invalidate(self):
+        # o próximo pedido desenha o frame inteiro de novo, mesmo sem
+        # mudança na cena (para as estatísticas medirem todas as etapas)
+        self.mutate(self.backing.invalidate)
+        with self._condition:
+            self._cancel()
+
+    def _cancel(self):
+        # com _condition: nenhum frame pedido até aqui vale mais
+        self.generation += 1
+        self._key = None
+
+    def paint(self, cr: cairo.Context, viewport: Rectangle, stats: Optional[FrameStats] = None):
+        # o último frame completo, a borda do viewport e as estatísticas
+        with self._front_lock:
+            if self.front is not None:
+                cr.set_source_surface(self.front, 0, 0)
+            else:
+                cr.set_source_rgb(0, 0, 0)
+            cr.paint()
+            cr.set_source_rgb(0, 0, 100)
+            cr.set_line_width(1.0)
+            viewport.draw(cr, viewport_matrix(viewport))
+            if stats is not None and stats.overlay:
+                stats.draw_overlay(cr)
+
+    def close(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
+
+    def _cancelled(self, generation: int) -> bool:
+        return generation != self.generation
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._request is None and not self._changes and self._running:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                request, self._request = self._request, None
+                changes, self._changes = self._changes, []
+            if changes:
+                self._apply(changes)
+            if request is None:
+                continue
+            try:
+                self._render(*request)
+            except FrameCancelled:
+                # a superfície ficou pela metade
+                self.backing.invalidate()
+            except Exception:
+                # um frame com erro não pode parar a thread
+                self.backing.invalidate()
+                traceback.print_exc()
+
+    def _apply(self, changes: List[Callable[[], None]]):
+        with self.lock:
+            for change in changes:
+                try:
+                    change()
+                except Exception:
+                    traceback.print_exc()
+        # a interface pede o frame da cena nova
+        self.on_frame()
+
+    def _render(self, generation, key, window, viewport, size, method, stats):
+        with self.lock:
+            if self._cancelled(generation):
+                return
+            if stats is not None:
+                stats.begin_frame()
+            surface = self.backing.update(
+                None, self.view.snapshot(window), viewport, size, method, stats,
+                cancelled=lambda: self._cancelled(generation),
+            )
+            # o frame pode ter mudado a versão da cena (transformações
+            # pendentes, nível de detalhe); é com ela que o próximo pedido
+            # vai ser comparado
+            version = self.view.store.version
+
+        with self._condition:
+            current = not self._cancelled(generation)
+            if current:
+                self._key = key[:-1] + (version,)
+        if current:
+            self._publish(surface, size)
+        if stats is not None:
+            with self._front_lock:
+                stats.end_frame()
+        if current:
+            self.on_frame()
+
+    def _publish(self, surface: cairo.Surface, size: Tuple[int, int]):
+        # copia para o buffer de trás e troca com o da frente
+        width, height = (int(v) for v in size)
+        if self._back is None or (self._back.get_width(), self._back.get_height()) != (width, height):
+            self._back = cairo.ImageSurface(cairo.FORMAT_RGB24, width, height)
+        cr = cairo.Context(self._back)
+        cr.set_operator(cairo.OPERATOR_SOURCE)
+        cr.set_source_surface(surface, 0, 0)
+        cr.paint()
+        self._back.flush()
+        with self._front_lock:
+            self.front, self._back = self._back, self.front
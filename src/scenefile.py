@@ -0,0 +1,311 @@
+import os
+import tempfile
+import numpy as np
+
+from contextlib import contextmanager, nullcontext
+from typing import BinaryIO, List, NamedTuple, Union
+
+from displayfile import ranges
+from drawable import Curve, GraphicObject, Line, Point, Polygon, View
+from tessellation import geometry
+
+# Cena em formato binário, para abrir com numpy.memmap:
+#
+#   cabeçalho      HEADER
+#   tabela         um OBJECT por objeto
+#   vértices       float64 (N, 3) em coordenadas do mundo, de todos os objetos
+#   controle       float64 (M, 3), pontos de controle das curvas
+#   nomes          UTF-8, enfileirados
+#
+# Cada seção começa num múltiplo de ALIGNMENT bytes. O bloco de vértices
+# vira o display file da View sem cópia (memmap copy-on-write), então abrir
+# a cena só lê a tabela; os vértices são lidos do disco à medida que os
+# objetos aparecem na window.
+
+PathOrFile = Union[str, os.PathLike, BinaryIO]
+
+MAGIC = b'SB-SCENE'
+VERSION = 1
+ALIGNMENT = 64
+
+HEADER = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u4'),
+    ('reserved', '<u4'),
+    ('n_objects', '<u8'),
+    ('n_vertices', '<u8'),
+    ('n_control', '<u8'),
+    ('names_size', '<u8'),
+    ('table', '<u8'),
+    ('vertices', '<u8'),
+    ('control', '<u8'),
+    ('names', '<u8'),
+])
+
+OBJECT = np.dtype([
+    ('type', 'u1'),
+    ('flags', 'u1'),
+    ('reserved', '<u2'),
+    ('name_length', '<u4'),
+    ('name_offset', '<u8'),
+    ('vertex_offset', '<u8'),
+    ('vertex_count', '<u8'),
+    ('control_offset', '<u8'),
+    ('control_count', '<u8'),
+    ('bounds', '<f8', (4,)),
+])
+
+POINT, LINE, POLYGON, CURVE = range(4)
+
+# flags
+FILLED = 1
+BSPLINE = 2
+ADAPTIVE = 4
+
+# objetos por escrita no bloco de vértices
+WRITE_CHUNK = 4096
+
+
+class Scene(NamedTuple):
+    header: np.ndarray
+    table: np.ndarray
+    vertices: np.ndarray
+    control: np.ndarray
+    names: np.ndarray
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _type_code(object: GraphicObject) -> int:
+    for cls, code in ((Point, POINT), (Line, LINE), (Polygon, POLYGON), (Curve, CURVE)):
+        if isinstance(object, cls):
+            return code
+    raise ValueError(f'objeto não suportado: {type(object).__name__}')
+
+
+def _flags(object: GraphicObject) -> int:
+    flags = 0
+    if isinstance(object, Polygon) and object.filled:
+        flags |= FILLED
+    if isinstance(object, Curve):
+        if object.type == 'bspline':
+            flags |= BSPLINE
+        if object.adaptive:
+            flags |= ADAPTIVE
+    return flags
+
+
+def _control_points(object: GraphicObject) -> np.ndarray:
+    if isinstance(object, Curve) and object.control_points is not None:
+        return object.control_points
+    return np.empty((0, 3))
+
+
+def _block_bounds(vertices: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    bounds = np.full((len(lengths), 4), np.nan)
+    filled = lengths > 0
+    if filled.any():
+        starts = (np.cumsum(lengths) - lengths)[filled]
+        bounds[filled, :2] = np.minimum.reduceat(vertices[:, :2], starts)
+        bounds[filled, 2:] = np.maximum.reduceat(vertices[:, :2], starts)
+    return bounds
+
+
+def _write_blocks(f: BinaryIO, blocks: List[np.ndarray], lengths: np.ndarray, bounds=None):
+    for start in range(0, len(blocks), WRITE_CHUNK):
+        chunk = blocks[start:start + WRITE_CHUNK]
+        if not chunk:
+            continue
+        data = np.ascontiguousarray(np.concatenate(chunk), dtype='<f8')
+        if bounds is not None:
+            bounds[start:start + len(chunk)] = _block_bounds(data, lengths[start:start + len(chunk)])
+        f.write(data.tobytes())
+
+
+def _pad(f: BinaryIO, offset: int):
+    f.write(bytes(offset - f.tell()))
+
+
+@contextmanager
+def _replacing(path: Union[str, os.PathLike]):
+    # o arquivo novo é escrito ao lado e só no fim toma o lugar do destino:
+    # uma cena aberta dele mesmo é um memmap do arquivo antigo, que precisa
+    # continuar inteiro enquanto os vértices são lidos para a escrita
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp = tempfile.mkstemp(dir=directory, suffix='.sbs.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+        mode = os.stat(path).st_mode if os.path.exists(path) else 0o644
+        os.chmod(temp, mode & 0o777)
+        os.replace(temp, path)
+    except BaseException:
+        os.unlink(temp)
+        raise
+
+
+def write(file: PathOrFile, objects: List[GraphicObject]):
+    objects = list(objects)
+    blocks = [object.vertices for object in objects]
+    controls = [_control_points(object) for object in objects]
+    names = [str(object.name).encode('utf-8') for object in objects]
+
+    table = np.zeros(len(objects), dtype=OBJECT)
+    table['type'] = [_type_code(object) for object in objects]
+    table['flags'] = [_flags(object) for object in objects]
+    vertex_count = np.fromiter(map(len, blocks), dtype=np.int64, count=len(blocks))
+    control_count = np.fromiter(map(len, controls), dtype=np.int64, count=len(controls))
+    name_length = np.fromiter(map(len, names), dtype=np.int64, count=len(names))
+    table['vertex_count'] = vertex_count
+    table['vertex_offset'] = np.cumsum(vertex_count) - vertex_count
+    table['control_count'] = control_count
+    table['control_offset'] = np.cumsum(control_count) - control_count
+    table['name_length'] = name_length
+    table['name_offset'] = np.cumsum(name_length) - name_length
+
+    header = np.zeros((), dtype=HEADER)
+    header['magic'] = MAGIC
+    header['version'] = VERSION
+    header['n_objects'] = len(objects)
+    header['n_vertices'] = n_vertices = int(vertex_count.sum())
+    header['n_control'] = n_control = int(control_count.sum())
+    header['names_size'] = int(name_length.sum())
+    header['table'] = _align(HEADER.itemsize)
+    header['vertices'] = _align(int(header['table']) + table.nbytes)
+    header['control'] = _align(int(header['vertices']) + 24 * n_vertices)
+    header['names'] = _align(int(header['control']) + 24 * n_control)
+
+    with _replacing(file) if isinstance(file, (str, os.PathLike)) else nullcontext(file) as f:
+        start = f.tell()
+        f.write(header.tobytes())
+
+        # a tabela só fica completa depois dos vértices (bounding boxes)
+        bounds = table['bounds']
+        _pad(f, start + int(header['vertices']))
+        _write_blocks(f, blocks, vertex_count, bounds)
+        _pad(f, start + int(header['control']))
+        _write_blocks(f, controls, control_count)
+        _pad(f, start + int(header['names']))
+        f.write(b''.join(names))
+        end = f.tell()
+
+        f.seek(start + int(header['table']))
+        f.write(table.tobytes())
+        f.seek(end)
+
+
+def read(path: Union[str, os.PathLike]) -> Scene:
+    # só o cabeçalho é lido agora; o resto são memmaps sobre o arquivo
+    header = np.fromfile(path, dtype=HEADER, count=1)
+    if not len(header) or header['magic'][0] != MAGIC:
+        raise ValueError(f'{path}: não é um arquivo de cena')
+    header = header[0]
+    if header['version'] != VERSION:
+        raise ValueError(f'{path}: versão {header["version"]} não suportada')
+
+    def section(name, dtype, shape):
+        if not np.prod(shape):
+            return np.empty(shape, dtype=dtype)
+        # copy-on-write: o display file pode ser alterado sem mexer no arquivo
+        return np.memmap(path, dtype=dtype, mode='c', offset=int(header[name]), shape=shape)
+
+    return Scene(
+        header,
+        section('table', OBJECT, (int(header['n_objects']),)),
+        section('vertices', '<f8', (int(header['n_vertices']), 3)),
+        section('control', '<f8', (int(header['n_control']), 3)),
+        section('names', 'u1', (int(header['names_size']),)),
+    )
+
+
+def _names(scene: Scene, rows: np.ndarray) -> List[str]:
+    blob = scene.names.tobytes()
+    starts = scene.table['name_offset'][rows].tolist()
+    ends = (scene.table['name_offset'][rows] + scene.table['name_length'][rows]).tolist()
+    return [blob[start:end].decode('utf-8') for start, end in zip(starts, ends)]
+
+
+def _empties(cls, names: List[str], **attributes) -> List[GraphicObject]:
+    # cópias do estado de um protótipo, bem mais baratas que o __init__;
+    # só para tipos sem estado mutável próprio (pontos, retas, polígonos)
+    state = vars(cls.empty(**attributes))
+    objects = []
+    for name in names:
+        object = cls.__new__(cls)
+        object.__dict__.update(state)
+        object.name = name
+        objects.append(object)
+    return objects
+
+
+def _objects(scene: Scene) -> List[GraphicObject]:
+    table = scene.table
+    codes, flags = table['type'], table['flags']
+    unknown = ~np.isin(codes, (POINT, LINE, POLYGON, CURVE))
+    if unknown.any():
+        raise ValueError(f'tipo de objeto desconhecido: {codes[unknown][0]}')
+
+    objects: List[GraphicObject] = [None] * len(table)
+    for cls, mask, attributes in (
+            (Point, codes == POINT, {}),
+            (Line, codes == LINE, {}),
+            (Polygon, (codes == POLYGON) & ((flags & FILLED) == 0), {'filled': False}),
+            (Polygon, (codes == POLYGON) & ((flags & FILLED) != 0), {'filled': True}),
+    ):
+        rows = np.flatnonzero(mask)
+        for row, object in zip(rows.tolist(), _empties(cls, _names(scene, rows), **attributes)):
+            objects[row] = object
+
+    rows = np.flatnonzero(codes == CURVE)
+    for row, name in zip(rows.tolist(), _names(scene, rows)):
+        entry = table[row]
+        objects[row] = _curve(
+            scene,
+            name,
+            int(entry['flags']),
+            int(entry['control_offset']),
+            int(entry['control_count']),
+            int(entry['vertex_count']),
+        )
+    return objects
+
+
+def _curve(scene: Scene, name, flags, control_offset, control_count, vertex_count) -> Curve:
+    if not control_count:
+        return Curve([], name=name)
+
+    type = 'bspline' if flags & BSPLINE else 'bezier'
+    control_points = scene.control[control_offset:control_offset + control_count]
+    # tesselação uniforme: mesmo número de vértices em cada segmento. As
+    # adaptativas foram salvas num nível de detalhe, com segmentos de
+    # tamanhos diferentes; até o primeiro nível de detalhe calculado na
+    # View elas são recortadas como polilinhas, sem os offsets
+    n_segments = len(geometry(control_points, type))
+    offsets = None
+    if not flags & ADAPTIVE and n_segments and vertex_count % n_segments == 0:
+        offsets = np.arange(n_segments + 1) * (vertex_count // n_segments)
+    return Curve(
+        [],
+        name=name,
+        control_points=control_points,
+        type=type,
+        adaptive=bool(flags & ADAPTIVE),
+        segment_offsets=offsets,
+    )
+
+
+def load(path: Union[str, os.PathLike], view: View) -> List[GraphicObject]:
+    scene = read(path)
+    objects = _objects(scene)
+    table = scene.table
+    offsets = table['vertex_offset'].astype(np.int64)
+    lengths = table['vertex_count'].astype(np.int64)
+
+    if not view.store.count:
+        view.adopt(objects, scene.vertices, offsets, lengths, np.array(table['bounds']))
+    else:
+        # View já tem objetos: os vértices são copiados para o display file
+        view.add_objects(objects, scene.vertices[ranges(offsets, lengths)], lengths)
+    return objects
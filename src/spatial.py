@@ -0,0 +1,194 @@
+from collections import defaultdict
+from math import floor, sqrt
+from typing import Dict, Optional, Set, Tuple
+
+import numpy as np
+
+Bounds = Tuple[float, float, float, float]
+
+
+def _sides(bounds: np.ndarray) -> np.ndarray:
+    # lado maior de cada caixa
+    return np.maximum(bounds[:, 2] - bounds[:, 0], bounds[:, 3] - bounds[:, 1])
+
+# enquanto não há objetos para medir a escala da cena
+DEFAULT_CELL_SIZE = 128.0
+# objetos por célula que o tamanho automático procura manter, sem
+# deixar as células menores que um objeto médio
+TARGET_PER_CELL = 8
+# a grade é refeita quando o tamanho ideal das células se afasta
+# do atual mais do que este fator, para cima ou para baixo
+DRIFT = 4.0
+
+
+# Grade uniforme sobre as bounding boxes dos objetos no mundo.
+# Objetos que ocupariam células demais ficam numa lista à parte
+# e são sempre candidatos. Sem `cell_size` o tamanho das células
+# acompanha a extensão e o número de objetos da cena.
+class UniformGrid:
+    def __init__(self, cell_size: float = None, max_cells: int = 1024):
+        self.automatic = cell_size is None
+        self.cell_size = cell_size or DEFAULT_CELL_SIZE
+        self.max_cells = max_cells
+        self.cells: Dict[Tuple[int, int], Set[int]] = defaultdict(set)
+        self.keys: Dict[int, Tuple[int, int, int, int]] = {}
+        self.large: Set[int] = set()
+        # caixa de tudo o que já entrou na grade desde a última reconstrução,
+        # e a soma dos lados maiores das caixas que entraram
+        self.extent: Optional[Bounds] = None
+        self.sizes = 0.0
+        self.inserted = 0
+
+    def __len__(self) -> int:
+        return len(self.keys) + len(self.large)
+
+    def __contains__(self, slot: int) -> bool:
+        return slot in self.keys or slot in self.large
+
+    def _cell_range(self, bounds: Bounds) -> Tuple[int, int, int, int]:
+        xmin, ymin, xmax, ymax = bounds
+        return (
+            floor(xmin / self.cell_size),
+            floor(ymin / self.cell_size),
+            floor(xmax / self.cell_size),
+            floor(ymax / self.cell_size),
+        )
+
+    def _grow(self, xmin: float, ymin: float, xmax: float, ymax: float, sizes: float, n: int = 1):
+        self.sizes += sizes
+        self.inserted += n
+        if self.extent is None:
+            self.extent = (xmin, ymin, xmax, ymax)
+        else:
+            x0, y0, x1, y1 = self.extent
+            self.extent = (min(x0, xmin), min(y0, ymin), max(x1, xmax), max(y1, ymax))
+
+    def ideal_cell_size(
+            self,
+            extent: Bounds = None,
+            count: int = None,
+            mean_size: float = None,
+    ) -> Optional[float]:
+        # células com uns TARGET_PER_CELL objetos se eles se espalham
+        # pela extensão da cena; None se ainda não há como medir
+        extent = self.extent if extent is None else extent
+        count = len(self) if count is None else count
+        if mean_size is None:
+            mean_size = self.sizes / self.inserted if self.inserted else 0.0
+        if extent is None or not count:
+            return None
+        xmin, ymin, xmax, ymax = extent
+        side = max(xmax - xmin, ymax - ymin)
+        if not side > 0:
+            return None
+        return max(side * sqrt(TARGET_PER_CELL / count), mean_size)
+
+    def drifted(self) -> bool:
+        if not self.automatic:
+            return False
+        ideal = self.ideal_cell_size()
+        return ideal is not None and not 1 / DRIFT <= ideal / self.cell_size <= DRIFT
+
+    def fit(self, bounds: np.ndarray):
+        # escolhe o tamanho das células para as caixas dadas; só faz
+        # sentido com a grade vazia
+        bounds = np.asarray(bounds)
+        if not self.automatic or not len(bounds):
+            return
+        extent = (*bounds[:, :2].min(axis=0).tolist(), *bounds[:, 2:].max(axis=0).tolist())
+        ideal = self.ideal_cell_size(extent, len(bounds), float(_sides(bounds).mean()))
+        if ideal is not None:
+            self.cell_size = ideal
+
+    def rebuild(self, slots: np.ndarray, bounds: np.ndarray):
+        # recomeça do zero, com células do tamanho ideal para os objetos dados
+        self.cells.clear()
+        self.keys.clear()
+        self.large.clear()
+        self.extent = None
+        self.sizes = 0.0
+        self.inserted = 0
+        self.fit(bounds)
+        self.insert_many(slots, bounds)
+
+    def insert(self, slot: int, bounds: Bounds):
+        xmin, ymin, xmax, ymax = bounds
+        self._grow(xmin, ymin, xmax, ymax, max(xmax - xmin, ymax - ymin))
+        i0, j0, i1, j1 = key = self._cell_range(bounds)
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > self.max_cells:
+            self.large.add(slot)
+            return
+
+        self.keys[slot] = key
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                self.cells[i, j].add(slot)
+
+    def insert_many(self, slots: np.ndarray, bounds: np.ndarray):
+        # vários objetos novos de uma vez; os que cabem numa célula só,
+        # que são a maioria, entram agrupados por célula
+        bounds = np.asarray(bounds)
+        if not len(bounds):
+            return
+        keys = np.floor(bounds / self.cell_size).astype(np.int64)
+        single = (keys[:, 0] == keys[:, 2]) & (keys[:, 1] == keys[:, 3])
+        if single.any():
+            # os demais são medidos em insert
+            grouped = bounds[single]
+            self._grow(
+                *grouped[:, :2].min(axis=0).tolist(), *grouped[:, 2:].max(axis=0).tolist(),
+                float(_sides(grouped).sum()), len(grouped),
+            )
+
+        for slot, row in zip(slots[~single].tolist(), bounds[~single].tolist()):
+            self.insert(slot, tuple(row))
+
+        slots, keys = slots[single], keys[single]
+        if not len(slots):
+            return
+        self.keys.update(zip(slots.tolist(), map(tuple, keys.tolist())))
+        order = np.lexsort((keys[:, 1], keys[:, 0]))
+        slots, keys = slots[order], keys[order, :2]
+        starts = np.flatnonzero(np.any(np.diff(keys, axis=0, prepend=keys[:1] - 1) != 0, axis=1))
+        ends = np.append(starts[1:], len(slots))
+        slots = slots.tolist()
+        for (i, j), start, end in zip(keys[starts].tolist(), starts.tolist(), ends.tolist()):
+            self.cells[i, j].update(slots[start:end])
+
+    def remove(self, slot: int):
+        if slot in self.large:
+            self.large.discard(slot)
+            return
+
+        i0, j0, i1, j1 = self.keys.pop(slot)
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                cell = self.cells[i, j]
+                cell.discard(slot)
+                if not cell:
+                    del self.cells[i, j]
+
+    def update(self, slot: int, bounds: Bounds):
+        # só mexe na grade se o objeto mudou de células
+        if slot in self.keys and self.keys[slot] == self._cell_range(bounds):
+            return
+        if slot in self.keys or slot in self.large:
+            self.remove(slot)
+        self.insert(slot, bounds)
+
+    def query(self, bounds: Bounds) -> Set[int]:
+        i0, j0, i1, j1 = self._cell_range(bounds)
+        found = set(self.large)
+
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > len(self.cells):
+            # window maior que a parte ocupada da grade
+            for (i, j), cell in self.cells.items():
+                if i0 <= i <= i1 and j0 <= j <= j1:
+                    found |= cell
+        else:
+            for i in range(i0, i1 + 1):
+                for j in range(j0, j1 + 1):
+                    cell = self.cells.get((i, j))
+                    if cell:
+                        found |= cell
+        return found
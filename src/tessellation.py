@@ -0,0 +1,128 @@
+import numpy as np
+from functools import lru_cache
+from typing import Tuple
+
+# produto da matriz de Hermite pela
+# matriz de compatibilidade de Hermite para Bezier
+BEZIER_MATRIX = np.array(
+    [
+        -1, 3, -3, 1,
+        3, -6, 3, 0,
+        -3, 3, 0, 0,
+        1, 0, 0, 0
+    ],
+    dtype=float
+).reshape(4, 4)
+
+BSPLINE_MATRIX = np.array(
+    [
+        -1, 3, -3, 1,
+        3, -6, 3, 0,
+        -3, 0, 3, 0,
+        1, 4, 1, 0
+    ],
+    dtype=float
+).reshape(4, 4) / 6
+
+BASIS = {
+    'bezier': BEZIER_MATRIX,
+    'bspline': BSPLINE_MATRIX,
+}
+
+# passo entre o primeiro ponto de controle de dois segmentos seguidos
+STEP = {
+    'bezier': 3,
+    'bspline': 1,
+}
+
+for _matrix in BASIS.values():
+    _matrix.setflags(write=False)
+
+
+@lru_cache(maxsize=64)
+def blending_matrix(type: str, n_points: int) -> np.ndarray:
+    # linha i: [t³, t², t, 1] @ M para o i-ésimo valor de t
+    t = np.linspace(0, 1, n_points)
+    T = np.stack([t**3, t**2, t, np.ones_like(t)], axis=1)
+    blending = T @ BASIS[type]
+    blending.setflags(write=False)
+    return blending
+
+
+def geometry(control_points: np.ndarray, type: str) -> np.ndarray:
+    # vetores de geometria (S, 4, 2) de todos os segmentos da curva
+    points = np.asarray(control_points, dtype=float)[:, :2]
+    step = STEP[type]
+    n_segments = max((len(points) - 4) // step + 1, 0)
+    index = np.arange(n_segments)[:, None] * step + np.arange(4)
+    return points[index]
+
+
+def segment_hulls(control_points: np.ndarray, type: str) -> np.ndarray:
+    # xmin, ymin, xmax, ymax dos pontos de controle de cada segmento:
+    # o segmento está dentro do fecho convexo dos seus pontos de controle
+    G = geometry(control_points, type)
+    return np.concatenate([G.min(axis=1), G.max(axis=1)], axis=1)
+
+
+def samples(type: str, n_points: int) -> int:
+    # a B-spline inclui o último ponto de cada segmento (t = 1)
+    return n_points + 1 if type == 'bspline' else n_points
+
+
+def segment_offsets(control_points: np.ndarray, type: str, n_points: int) -> np.ndarray:
+    # primeiro vértice tesselado de cada segmento (e o total no fim)
+    n_segments = len(geometry(control_points, type))
+    return np.arange(n_segments + 1) * samples(type, n_points)
+
+
+def tessellate(control_points: np.ndarray, type: str = 'bezier', n_points: int = 20) -> np.ndarray:
+    G = geometry(control_points, type)
+    blending = blending_matrix(type, samples(type, n_points))
+
+    # todos os segmentos em todos os parâmetros num só produto
+    points = np.einsum('tk,skd->std', blending, G).reshape(-1, 2)
+    vertices = np.ones((len(points), 3), dtype=float)
+    vertices[:, :2] = points
+    return vertices
+
+
+# leva a geometria B-spline de um segmento para os pontos de Bezier equivalentes
+BSPLINE_TO_BEZIER = np.linalg.inv(BEZIER_MATRIX) @ BSPLINE_MATRIX
+BSPLINE_TO_BEZIER.setflags(write=False)
+
+
+def segment_counts(G: np.ndarray, type: str, scale: float, tolerance: float) -> np.ndarray:
+    # quantos trechos retos cada segmento precisa para que a distância
+    # à curva fique abaixo de `tolerance` pixels (fórmula de Wang, grau 3)
+    if type == 'bspline':
+        G = np.einsum('ij,sjd->sid', BSPLINE_TO_BEZIER, G)
+    second = G[:, :2] - 2 * G[:, 1:3] + G[:, 2:]
+    L = np.linalg.norm(second, axis=2).max(axis=1) * scale
+    return np.maximum(np.ceil(np.sqrt(0.75 * L / tolerance)), 1).astype(np.int64)
+
+
+def adaptive_tessellate(
+        control_points: np.ndarray,
+        type: str,
+        scale: float,
+        tolerance: float = 0.5,
+) -> Tuple[np.ndarray, np.ndarray]:
+    G = geometry(control_points, type)
+    if not len(G):
+        return np.empty((0, 3)), np.zeros(1, dtype=np.int64)
+    counts = segment_counts(G, type, scale, tolerance)
+
+    # o primeiro ponto de cada segmento repete o último do anterior
+    n_samples = counts.copy()
+    n_samples[0] += 1
+    segment = np.repeat(np.arange(len(G)), n_samples)
+    k = np.arange(len(segment)) - np.repeat(np.cumsum(n_samples) - n_samples, n_samples)
+    k[n_samples[0]:] += 1
+    t = k / counts[segment]
+
+    T = np.stack([t**3, t**2, t, np.ones_like(t)], axis=1)
+    points = np.einsum('rk,rkd->rd', T @ BASIS[type], G[segment])
+    vertices = np.ones((len(points), 3), dtype=float)
+    vertices[:, :2] = points
+    return vertices, np.concatenate([[0], np.cumsum(n_samples)])
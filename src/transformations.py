@@ -1,46 +1,115 @@
 import numpy as np
+from functools import lru_cache
 from math import cos, sin, radians
 
+# Matrizes de linha (v @ M), somente leitura: as mesmas matrizes voltam
+# do cache a cada chamada com os mesmos parâmetros, e as composições
+# usadas no desenho são montadas direto na forma fechada, sem os
+# produtos intermediários.
+CACHE_SIZE = 1024
+
+def _matrix(rows) -> np.ndarray:
+    matrix = np.array(rows, dtype=float)
+    matrix.setflags(write=False)
+    return matrix
+
+@lru_cache(maxsize=CACHE_SIZE)
 def rotation_matrix(angle: float) -> np.ndarray:
     angle = radians(angle)
-    return np.array(
-        [
-            cos(angle), -sin(angle),    0.0,
-            sin(angle), cos(angle),     0.0,
-            0.0,               0.0,     1.0
-        ],
-        dtype=float
-    ).reshape(3, 3)
+    return _matrix((
+        (cos(angle), -sin(angle),   0.0),
+        (sin(angle), cos(angle),    0.0),
+        (0.0,               0.0,    1.0),
+    ))
 
+@lru_cache(maxsize=CACHE_SIZE)
 def translate_matrix(dx: float, dy: float) -> np.ndarray:
-    return np.array(
-        [
-            1.0,  0.0,  0.0,
-            0.0,  1.0,  0.0,
-            dx,   dy,   1.0
-        ],
-        dtype=float
-    ).reshape(3, 3)
+    return _matrix((
+        (1.0,  0.0,  0.0),
+        (0.0,  1.0,  0.0),
+        (dx,   dy,   1.0),
+    ))
 
+@lru_cache(maxsize=CACHE_SIZE)
 def scale_matrix(sx: float, sy: float) -> np.ndarray:
-    return np.array(
-        [
-            sx, 0, 0,
-            0, sy, 0,
-            0, 0, 1,
-        ],
-        dtype=float
-    ).reshape(3, 3)
+    return _matrix((
+        (sx, 0, 0),
+        (0, sy, 0),
+        (0, 0, 1),
+    ))
+
+@lru_cache(maxsize=CACHE_SIZE)
+def scale_about(sx: float, sy: float, cx: float, cy: float) -> np.ndarray:
+    # translate(-c) @ scale(s) @ translate(c)
+    return _matrix((
+        (sx, 0, 0),
+        (0, sy, 0),
+        (cx * (1 - sx), cy * (1 - sy), 1),
+    ))
+
+@lru_cache(maxsize=CACHE_SIZE)
+def rotation_about(angle: float, cx: float, cy: float) -> np.ndarray:
+    # translate(-c) @ rotation(angle) @ translate(c)
+    angle = radians(angle)
+    c, s = cos(angle), sin(angle)
+    return _matrix((
+        (c, -s, 0),
+        (s, c, 0),
+        (cx * (1 - c) - cy * s, cy * (1 - c) + cx * s, 1),
+    ))
+
+def _corners(rectangle: 'Rectangle'):
+    (x0, y0, _), (x1, y1, _) = rectangle.vertices.tolist()
+    return x0, y0, x1, y1
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _viewport_matrix(x0, y0, x1, y1) -> np.ndarray:
+    # scale(w / 2, -h / 2) @ translate(centro)
+    return _matrix((
+        ((x1 - x0) / 2, 0, 0),
+        (0, -(y1 - y0) / 2, 0),
+        ((x0 + x1) / 2, (y0 + y1) / 2, 1),
+    ))
 
 def viewport_matrix(viewport: 'Rectangle') -> np.ndarray:
+    return _viewport_matrix(*_corners(viewport))
+
+def _normalized_rows(x0, y0, x1, y1, angle):
+    # translate(-centro) @ rotation(-angle) @ scale(2 / w, 2 / h)
+    angle = radians(angle)
+    c, s = cos(angle), sin(angle)
+    cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+    sx, sy = 2 / (x1 - x0), 2 / (y1 - y0)
     return (
-        scale_matrix(viewport.width / 2, -viewport.height / 2)
-        @ translate_matrix(viewport.centroid.x, viewport.centroid.y)
+        (c * sx, s * sy),
+        (-s * sx, c * sy),
+        ((cy * s - cx * c) * sx, -(cx * s + cy * c) * sy),
     )
 
+@lru_cache(maxsize=CACHE_SIZE)
+def _normalized_matrix(x0, y0, x1, y1, angle) -> np.ndarray:
+    (a, b), (c, d), (e, f) = _normalized_rows(x0, y0, x1, y1, angle)
+    return _matrix((
+        (a, b, 0),
+        (c, d, 0),
+        (e, f, 1),
+    ))
+
 def normalized_matrix(window: 'Window') -> np.ndarray:
-    return (
-        translate_matrix(-window.centroid.x, -window.centroid.y)
-        @ rotation_matrix(-window.angle)
-        @ scale_matrix(2 / window.width, 2 / window.height)
-    )
+    return _normalized_matrix(*_corners(window), window.angle)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _window_viewport_matrix(x0, y0, x1, y1, angle, vx0, vy0, vx1, vy1) -> np.ndarray:
+    # normalized_matrix(window) @ viewport_matrix(viewport)
+    (a, b), (c, d), (e, f) = _normalized_rows(x0, y0, x1, y1, angle)
+    sx, sy = (vx1 - vx0) / 2, -(vy1 - vy0) / 2
+    tx, ty = (vx0 + vx1) / 2, (vy0 + vy1) / 2
+    return _matrix((
+        (a * sx, b * sy, 0),
+        (c * sx, d * sy, 0),
+        (e * sx + tx, f * sy + ty, 1),
+    ))
+
+def window_viewport_matrix(window: 'Window', viewport: 'Rectangle') -> np.ndarray:
+    # mundo direto para a tela
+    return _window_viewport_matrix(*_corners(window), window.angle, *_corners(viewport))
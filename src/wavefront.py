@@ -0,0 +1,258 @@
+import os
+import numpy as np
+
+from array import array
+from contextlib import contextmanager
+from typing import IO, Iterator, List, Optional, Tuple, Union
+
+from displayfile import ranges
+from drawable import Curve, GraphicObject, Line, Point, Polygon, View
+from tessellation import segment_offsets, tessellate
+
+# Leitura e escrita de cenas no formato Wavefront OBJ.
+#
+#   v x y [z]        vértice (z é ignorado)
+#   p i j ...        um ponto por índice
+#   l i j            reta
+#   l i j k ... i    polígono vazado (primeiro índice repetido no fim)
+#   l i j k ...      polilinha aberta
+#   f i j k ...      polígono preenchido
+#   cstype bezier|bspline, deg 3, curv u0 u1 i j k ..., end
+#   o nome / g nome  nome dos objetos seguintes
+#
+# O arquivo é lido linha a linha: coordenadas e índices vão direto para
+# arrays compactos e os objetos entram na View num único lote.
+
+PathOrFile = Union[str, os.PathLike, IO[str]]
+
+CURVE_TYPES = ('bezier', 'bspline')
+
+# objetos por chamada de savetxt ao escrever os vértices
+WRITE_CHUNK = 4096
+
+
+@contextmanager
+def _open(file: PathOrFile, mode: str):
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, mode) as f:
+            yield f
+    else:
+        yield file
+
+
+def _statements(lines) -> Iterator[Tuple[int, List[str]]]:
+    # linhas lógicas sem comentários, juntando as continuadas com '\'
+    pending = []
+    for number, line in enumerate(lines, 1):
+        if '#' in line:
+            line = line.split('#', 1)[0]
+        line = line.strip()
+        if line.endswith('\\'):
+            pending.append(line[:-1])
+            continue
+        if pending:
+            pending.append(line)
+            line = ' '.join(pending)
+            pending = []
+        if line:
+            yield number, line.split()
+
+
+class _Reader:
+    def __init__(self, n_points: int, adaptive: bool, executor: Optional['ParallelExecutor'] = None):
+        self.n_points = n_points
+        self.adaptive = adaptive
+        self.executor = executor
+        # x, y, 1 de cada `v`
+        self.coords = array('d')
+        # vértices dos objetos que não são curvas, enfileirados
+        self.index = array('q')
+        # vértices de cada objeto; as curvas só são conhecidas no fim
+        self.lengths = array('q')
+        self.objects: List[GraphicObject] = []
+        # posição em `objects`, nome, tipo e índices dos pontos de controle
+        self.curves: List[Tuple[int, str, str, array]] = []
+        self.name = ''
+        self.cstype = 'bezier'
+
+    @property
+    def n_vertices(self) -> int:
+        return len(self.coords) // 3
+
+    def resolve(self, tokens: List[str]) -> List[int]:
+        n = self.n_vertices
+        result = []
+        for token in tokens:
+            # descarta textura e normal de `i/t/n`
+            i = int(token.split('/', 1)[0])
+            i = n + i if i < 0 else i - 1
+            if not 0 <= i < n:
+                raise ValueError(f'índice de vértice inválido: {token}')
+            result.append(i)
+        return result
+
+    def add(self, object: GraphicObject, index: List[int]):
+        self.objects.append(object)
+        self.index.extend(index)
+        self.lengths.append(len(index))
+
+    def statement(self, tokens: List[str]):
+        keyword, args = tokens[0], tokens[1:]
+
+        if keyword in ('o', 'g'):
+            self.name = ' '.join(args)
+        elif keyword == 'p':
+            for i in self.resolve(args):
+                self.add(Point.empty(self.name), [i])
+        elif keyword == 'l':
+            index = self.resolve(args)
+            if len(index) == 2:
+                self.add(Line.empty(self.name), index)
+            elif len(index) > 3 and index[0] == index[-1]:
+                self.add(Polygon.empty(self.name, filled=False), index[:-1])
+            elif len(index) > 2:
+                self.add(Curve([], name=self.name), index)
+        elif keyword == 'f':
+            self.add(Polygon.empty(self.name, filled=True), self.resolve(args))
+        elif keyword == 'cstype':
+            if args[-1] not in CURVE_TYPES:
+                raise ValueError(f'tipo de curva não suportado: {args[-1]}')
+            self.cstype = args[-1]
+        elif keyword == 'deg':
+            if int(args[0]) != 3:
+                raise ValueError('só curvas de grau 3 são suportadas')
+        elif keyword == 'curv':
+            self.curves.append((
+                len(self.objects),
+                self.name,
+                self.cstype,
+                array('q', self.resolve(args[2:])),
+            ))
+            self.objects.append(None)
+            self.lengths.append(0)
+
+    def finish(self) -> Tuple[List[GraphicObject], np.ndarray, np.ndarray]:
+        positions = np.frombuffer(self.coords, dtype=float).reshape(-1, 3)
+        lengths = np.array(self.lengths, dtype=np.int64)
+        index = np.frombuffer(self.index, dtype=np.int64)
+        if not self.curves:
+            return self.objects, positions[index], lengths
+
+        control_points = [positions[np.frombuffer(index, dtype=np.int64)] for *_, index in self.curves]
+        types = [type for _, _, type, _ in self.curves]
+        if self.executor is not None:
+            tessellated = self.executor.tessellate(control_points, types, self.n_points)
+        else:
+            tessellated = [
+                (tessellate(points, type, self.n_points), segment_offsets(points, type, self.n_points))
+                for points, type in zip(control_points, types)
+            ]
+
+        for (position, name, type, _), points, (vertices, offsets) in zip(
+                self.curves, control_points, tessellated):
+            self.objects[position] = Curve(
+                vertices,
+                name=name,
+                control_points=points,
+                type=type,
+                adaptive=self.adaptive,
+                segment_offsets=offsets,
+            )
+            lengths[position] = len(vertices)
+
+        offsets = np.cumsum(lengths) - lengths
+        vertices = np.empty((int(lengths.sum()), 3), dtype=float)
+        plain = np.ones(len(lengths), dtype=bool)
+        plain[[position for position, *_ in self.curves]] = False
+        vertices[ranges(offsets[plain], lengths[plain])] = positions[index]
+        for position, *_ in self.curves:
+            start = offsets[position]
+            vertices[start:start + lengths[position]] = self.objects[position].vertices
+        return self.objects, vertices, lengths
+
+
+def read(
+        file: PathOrFile,
+        n_points: int = 20,
+        adaptive: bool = False,
+        executor: Optional['ParallelExecutor'] = None,
+) -> Tuple[List[GraphicObject], np.ndarray, np.ndarray]:
+    # objetos ainda sem vértices, e os vértices de todos eles
+    # enfileirados, prontos para View.add_objects; com um executor
+    # as curvas são tesseladas em paralelo
+    reader = _Reader(n_points, adaptive, executor)
+    coords = reader.coords
+    with _open(file, 'r') as f:
+        for number, tokens in _statements(f):
+            try:
+                # vértices são a maior parte do arquivo
+                if tokens[0] == 'v':
+                    coords.extend((float(tokens[1]), float(tokens[2]), 1.0))
+                else:
+                    reader.statement(tokens)
+            except (ValueError, IndexError) as error:
+                raise ValueError(f'linha {number}: {error}') from error
+    return reader.finish()
+
+
+def load(
+        file: PathOrFile,
+        view: View,
+        n_points: int = 20,
+        adaptive: bool = False,
+        executor: Optional['ParallelExecutor'] = None,
+) -> List[GraphicObject]:
+    objects, vertices, lengths = read(file, n_points, adaptive, executor)
+    view.add_objects(objects, vertices, lengths)
+    return objects
+
+
+def _points_of(object: GraphicObject) -> np.ndarray:
+    if isinstance(object, Curve) and object.control_points is not None:
+        return object.control_points
+    return object.vertices
+
+
+def _element(object: GraphicObject, start: int, n: int) -> str:
+    index = ' '.join(map(str, range(start, start + n)))
+
+    if isinstance(object, Point):
+        return f'p {index}\n'
+    if isinstance(object, Line):
+        return f'l {index}\n'
+    if isinstance(object, Polygon):
+        if object.filled:
+            return f'f {index}\n'
+        return f'l {index} {start}\n'
+    if isinstance(object, Curve) and object.control_points is not None:
+        if object.type == 'bspline':
+            knots = range(n + 4)
+            u0, u1 = 3, n
+        else:
+            knots = range((n - 1) // 3 + 1)
+            u0, u1 = 0, (n - 1) // 3
+        return (
+            f'cstype {object.type}\n'
+            f'deg 3\n'
+            f'curv {u0} {u1} {index}\n'
+            f'parm u {" ".join(map(str, knots))}\n'
+            f'end\n'
+        )
+    return f'l {index}\n'
+
+
+def write(file: PathOrFile, objects: List[GraphicObject]):
+    blocks = [_points_of(object) for object in objects]
+
+    with _open(file, 'w') as f:
+        # todos os vértices primeiro, em pedaços, depois os elementos
+        for start in range(0, len(blocks), WRITE_CHUNK):
+            chunk = blocks[start:start + WRITE_CHUNK]
+            np.savetxt(f, np.concatenate(chunk)[:, :2], fmt='v %.17g %.17g')
+
+        start = 1
+        for object, block in zip(objects, blocks):
+            name = ' '.join(str(object.name).split())
+            f.write(f'o {name}\n' if name else 'o\n')
+            f.write(_element(object, start, len(block)))
+            start += len(block)
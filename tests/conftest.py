@@ -0,0 +1,5 @@
+import os
+import sys
+
+# os módulos ficam soltos em src/, como o basico.py os importa
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
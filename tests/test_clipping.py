@@ -0,0 +1,85 @@
+import numpy as np
+
+from clipping import (
+    LineClippingMethod, clip_curve_vertices, line_clip, line_clip_batch, polyline_clip,
+)
+from drawable import Line, Vetor2D, Window
+
+
+def runs(vertices):
+    # trechos separados por BREAK, só x e y
+    vertices = np.asarray(vertices)
+    parts = np.split(vertices, np.flatnonzero(np.isnan(vertices[:, 0])))
+    parts = [part[~np.isnan(part[:, 0]), :2] for part in parts]
+    return [part for part in parts if len(part)]
+
+
+def test_polyline_inside():
+    vertices = [[-.5, 0, 1], [0, .5, 1], [.5, 0, 1]]
+    assert np.allclose(polyline_clip(vertices), vertices)
+
+
+def test_polyline_exit_and_reentry():
+    # sai pela direita num segmento e volta no seguinte: dois trechos,
+    # sem a corda entre o ponto de saída e o vértice seguinte
+    parts = runs(polyline_clip([[.5, 0, 1], [1.5, .5, 1], [.5, .9, 1]]))
+    assert len(parts) == 2
+    assert np.allclose(parts[0], [[.5, 0], [1, .25]])
+    assert np.allclose(parts[1], [[1, .7], [.5, .9]])
+
+
+def test_polyline_outside():
+    assert len(polyline_clip([[2, 2, 1], [3, 2, 1]])) == 0
+
+
+def test_curve_exit_and_reentry():
+    vertices = np.array([[.5, 0, 1], [1.5, .5, 1], [.5, .9, 1]])
+    hulls = np.array([[.5, 0, 1.5, .9]])
+    offsets = np.array([0, 3])
+    parts = runs(clip_curve_vertices(vertices, hulls, offsets))
+    assert len(parts) == 2
+    assert np.allclose(parts[0][-1], [1, .25])
+    assert np.allclose(parts[1][0], [1, .7])
+
+
+def normalized_lines(segments):
+    # a window [-1, 1]² deixa as coordenadas normalizadas iguais às do mundo
+    window = Window(Vetor2D(-1, -1), Vetor2D(1, 1))
+    lines = [Line(Vetor2D(x0, y0), Vetor2D(x1, y1)) for x0, y0, x1, y1 in segments]
+    for line in lines:
+        line.update_norm_coord(window)
+    return lines
+
+
+def check_batch(segments):
+    lines = normalized_lines(segments)
+    vertices = np.array([line.normalized_vertices for line in lines])
+    for method in LineClippingMethod:
+        inicio, fim, index = line_clip_batch(vertices[:, 0], vertices[:, 1], method)
+        scalar = [line_clip(line, method) for line in lines]
+        assert index.tolist() == [i for i, clipped in enumerate(scalar) if clipped is not None]
+        expected = np.array([scalar[i].normalized_vertices for i in index]).reshape(-1, 2, 3)
+        assert np.allclose(inicio, expected[:, 0])
+        assert np.allclose(fim, expected[:, 1])
+
+
+def test_batch_matches_scalar():
+    check_batch(np.random.default_rng(0).uniform(-2, 2, (5000, 4)))
+
+
+def test_batch_matches_scalar_degenerate():
+    check_batch([
+        # comprimento zero: dentro, fora e na borda
+        [0, 0, 0, 0],
+        [1.5, .5, 1.5, .5],
+        [1, .5, 1, .5],
+        # paralelas a uma borda: dentro, fora e sobre ela
+        [-.5, .5, .5, .5],
+        [-.5, 1.5, .5, 1.5],
+        [-1.5, 1, 1.5, 1],
+        [-1, -1.5, -1, 1.5],
+        [.5, -3, .5, 3],
+        [1.5, -3, 1.5, 3],
+        # só encosta no canto (1, 1)
+        [0, 2, 2, 0],
+    ])
@@ -0,0 +1,96 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import numpy as np
+
+import scenefile
+import wavefront
+from drawable import Curve, Line, Point, Polygon, Vetor2D, View
+
+
+def objects():
+    control = [[0, 0, 1], [1, 2, 1], [2, -1, 1], [3, 0, 1], [4, 2, 1], [5, 1, 1], [6, 0, 1]]
+    return [
+        Point(Vetor2D(1, 2), name='ponto'),
+        Line(Vetor2D(0, 0), Vetor2D(3, 4), name='reta'),
+        Polygon([[0, 0, 1], [2, 0, 1], [1, 1, 1]], name='vazio'),
+        Polygon([[5, 5, 1], [6, 5, 1], [6, 6, 1], [5, 6, 1]], name='cheio', filled=True),
+        Curve.control_point(control, type='bezier', name='bezier'),
+        Curve.control_point(control, type='bspline', name='bspline'),
+    ]
+
+
+def check(original, loaded):
+    assert [type(o) for o in loaded] == [type(o) for o in original]
+    assert [o.name for o in loaded] == [o.name for o in original]
+    for a, b in zip(original, loaded):
+        assert np.allclose(a.vertices, b.vertices)
+        if isinstance(a, Polygon):
+            assert a.filled == b.filled
+        if isinstance(a, Curve):
+            assert a.type == b.type
+            assert np.allclose(a.control_points, b.control_points)
+
+
+def test_sbs_round_trip(tmp_path):
+    original = objects()
+    View(original)
+    scenefile.write(tmp_path / 'cena.sbs', original)
+    check(original, scenefile.load(tmp_path / 'cena.sbs', View()))
+
+
+def test_sbs_adaptive_curve_offsets(tmp_path):
+    # salva num nível de detalhe, com segmentos de tamanhos diferentes:
+    # os offsets lidos não podem ser um palpite errado
+    rng = np.random.default_rng(1)
+    original = []
+    for i in range(20):
+        control = np.ones((10, 3))
+        control[:, :2] = np.cumsum(rng.normal(0, 50, (10, 2)), axis=0)
+        curve = Curve.control_point(control, type='bspline', adaptive=True)
+        curve.level_of_detail(float(rng.uniform(0.5, 8)))
+        original.append(curve)
+    View(original)
+    scenefile.write(tmp_path / 'cena.sbs', original)
+    for a, b in zip(original, scenefile.load(tmp_path / 'cena.sbs', View())):
+        assert b.segment_offsets is None or np.array_equal(a.segment_offsets, b.segment_offsets)
+
+
+def test_obj_round_trip(tmp_path):
+    original = objects()
+    View(original)
+    wavefront.write(tmp_path / 'cena.obj', original)
+    check(original, wavefront.load(tmp_path / 'cena.obj', View()))
+
+
+def test_sbs_overwrite_loaded_scene(tmp_path):
+    # a cena aberta lê os vértices do próprio arquivo (memmap); salvar por
+    # cima dela não pode truncar o arquivo antes de os vértices serem lidos.
+    # Num processo à parte, porque o erro antigo era um SIGBUS
+    path = tmp_path / 'cena.sbs'
+    script = textwrap.dedent(f'''
+        import numpy as np
+        import scenefile
+        from drawable import Polygon, View
+
+        rng = np.random.default_rng(0)
+        vertices = np.ones((20000, 8, 3))
+        vertices[:, :, :2] = rng.uniform(-1000, 1000, (20000, 8, 2))
+        scenefile.write({str(path)!r}, [Polygon(v, name=str(i)) for i, v in enumerate(vertices)])
+
+        view = View()
+        objects = scenefile.load({str(path)!r}, view)
+        scenefile.write({str(path)!r}, objects)
+        loaded = scenefile.load({str(path)!r}, View())
+        assert len(loaded) == len(objects)
+        assert np.array_equal(loaded[-1].vertices, vertices[-1])
+    ''')
+    # com o mesmo sys.path, para achar os módulos de src/ como no conftest
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    result = subprocess.run(
+        [sys.executable, '-c', script],
+        cwd=str(tmp_path), env=env, capture_output=True, text=True,
+    )
+    assert result.returncode == 0, result.stderr
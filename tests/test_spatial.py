@@ -0,0 +1,33 @@
+import numpy as np
+
+from clipping import line_clip
+from drawable import Line, Vetor2D, View, Window
+
+
+def test_grid_keeps_visible_objects():
+    # linhas curtas e longas; depois de cada pan, zoom e rotação da window,
+    # toda linha que o clipping mantém tem que estar entre os candidatos
+    rng = np.random.default_rng(0)
+    starts = rng.uniform(-500, 500, (3000, 2))
+    ends = starts + rng.normal(0, 5, (3000, 2))
+    ends[::50] = starts[::50] + rng.normal(0, 300, (60, 2))
+    lines = [Line(Vetor2D(*start), Vetor2D(*end)) for start, end in zip(starts, ends)]
+
+    window = Window(Vetor2D(-100, -100), Vetor2D(100, 100))
+    view = View(window=window)
+    view.add_objects(lines)
+    steps = [
+        lambda: window.translate(Vetor2D(230, -40)),
+        lambda: window.scale(Vetor2D(.3, .3)),
+        lambda: setattr(window, 'angle', window.angle + 30),
+        lambda: window.translate(Vetor2D(-410, 260)),
+        lambda: window.scale(Vetor2D(4, 4)),
+        lambda: setattr(window, 'angle', window.angle + 75),
+    ]
+    for step in steps:
+        step()
+        view.update_norm_coord()
+        candidates = set(view.candidates().tolist())
+        visible = [line._slot for line in lines if line_clip(line) is not None]
+        assert visible
+        assert not set(visible) - candidates